@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,26 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(settings, tmp_path):
+    # Кэш проекта лежит в файле и переживает перезапуски: каждому тесту
+    # нужен свой, иначе он увидит страницы из прошлого прогона.
+    settings.CACHES = {
+        alias: {**config, 'LOCATION': str(tmp_path / f'{alias}.sqlite3')}
+        for alias, config in settings.CACHES.items()
+    }
+    # Как core/runner.py: очередь задач во временном файле и без пула
+    # потоков, иначе тесты пишут в jobs.sqlite3 проекта.
+    settings.JOB_QUEUE_PATH = str(tmp_path / 'jobs.sqlite3')
+    settings.JOB_WORKERS = 0
+    # Фоновая чистка сеансов писала бы в базу параллельно с тестом.
+    settings.SESSION_CLEANUP_INTERVAL = 0
+
+
+@pytest.fixture(autouse=True)
+def isolated_media(settings, tmp_path):
+    # Картинки, которые mixer дописывает постам, хранилище кладёт в
+    # MEDIA_ROOT: без этого они оставались бы в media/ проекта.
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
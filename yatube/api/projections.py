@@ -0,0 +1,110 @@
+"""Проекции моделей для JSON API.
+
+Каждое поле ответа — путь ORM (``author__username``), поэтому
+``fields=`` превращается прямо в ``values_list(...)``: из базы читаются
+только нужные столбцы, строки приходят кортежами, и объекты моделей не
+создаются. Преобразования (URL картинки, пустой счётчик) делаются над
+готовыми значениями.
+"""
+from django.http import JsonResponse
+
+from posts.models import Post
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+    def response(self):
+        return JsonResponse({'error': str(self)}, status=self.status)
+
+
+def image_url(name):
+    if not name:
+        return None
+    return Post._meta.get_field('image').storage.url(name)
+
+
+def count(value):
+    # Строки счётчиков пользователя может не быть (LEFT JOIN).
+    return value or 0
+
+
+class Projection:
+    """Набор полей ресурса: ``{имя в ответе: путь ORM}``."""
+
+    def __init__(self, fields, converters=None):
+        self.fields = fields
+        self.converters = converters or {}
+
+    def names(self, request):
+        """Поля из ``?fields=a,b``, по умолчанию все."""
+        raw = request.GET.get('fields')
+        if not raw:
+            return list(self.fields)
+        names = list(dict.fromkeys(
+            name.strip() for name in raw.split(',') if name.strip()
+        ))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise ApiError(
+                'Неизвестные поля: ' + ', '.join(unknown)
+                + '. Доступны: ' + ', '.join(self.fields)
+            )
+        return names
+
+    def values(self, queryset, names, extra=()):
+        """Кортежи полей ``names``, за ними служебные поля ``extra``."""
+        return queryset.values_list(
+            *[self.fields[name] for name in names], *extra
+        )
+
+    def serialize(self, names, row):
+        item = {}
+        for name, value in zip(names, row):
+            convert = self.converters.get(name)
+            item[name] = convert(value) if convert else value
+        return item
+
+
+POSTS = Projection(
+    {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    {'image': image_url},
+)
+COMMENTS = Projection({
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+})
+GROUPS = Projection({
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'posts_count': 'posts_count',
+})
+PROFILES = Projection(
+    {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'posts_count': 'stats__posts_count',
+        'followers_count': 'stats__followers_count',
+        'following_count': 'stats__following_count',
+    },
+    {
+        'posts_count': count,
+        'followers_count': count,
+        'following_count': count,
+    },
+)
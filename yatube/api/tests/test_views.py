@@ -0,0 +1,182 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_init
+from django.test import TestCase
+from django.urls import reverse
+
+from core.queries import capture
+from core.testing import QueryBudgetMixin
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group{i}', description='Описание'
+            )
+            for i in range(3)
+        ]
+        for i in range(settings.NUMBER_POSTS + 3):
+            cls.post = Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.groups[0]
+            )
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, query='', **kwargs):
+        response = self.client.get(
+            reverse(f'api:v1:{name}', kwargs=kwargs) + query
+        )
+        return response, response.json()
+
+    def test_post_list_pages_by_cursor(self):
+        response, data = self.get('post_list')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data['results']), settings.NUMBER_POSTS)
+        self.assertEqual(data['results'][0], {
+            'id': self.post.pk,
+            'text': self.post.text,
+            'pub_date': data['results'][0]['pub_date'],
+            'author': 'author',
+            'group': 'group0',
+            'image': None,
+            'comments_count': 3,
+        })
+        _, second = self.get('post_list', f'?after={data["next"]}')
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in data['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            ))
+        )
+
+    def test_fields_select_columns(self):
+        """``fields=`` сужает и ответ, и SELECT."""
+        with capture(record=True) as log:
+            _, data = self.get('post_list', '?fields=id,author&limit=2')
+        self.assertEqual(data['results'][0].keys(), {'id', 'author'})
+        self.assertEqual(len(data['results']), 2)
+        sql = log.statements[-1][1]
+        self.assertNotIn('"text"', sql)
+        self.assertIn('"username"', sql)
+
+    def test_unknown_field_is_400(self):
+        response, data = self.get('post_list', '?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', data['error'])
+        response, _ = self.get('post_list', '?after=broken')
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_model_instances(self):
+        created = []
+
+        def count(sender, **kwargs):
+            created.append(sender)
+
+        post_init.connect(count)
+        try:
+            self.get('post_list')
+            self.get('post_detail', post_id=self.post.pk)
+            self.get('comment_list', post_id=self.post.pk)
+            self.get('profile_detail', username='author')
+        finally:
+            post_init.disconnect(count)
+        self.assertEqual(created, [])
+
+    def test_details(self):
+        _, data = self.get('post_detail', '?fields=text', post_id=self.post.pk)
+        self.assertEqual(data, {'text': self.post.text})
+        _, data = self.get('group_detail', slug='group0')
+        self.assertEqual(data['posts_count'], settings.NUMBER_POSTS + 3)
+        _, data = self.get('profile_detail', username='author')
+        self.assertEqual(data, {
+            'username': 'author',
+            'first_name': 'Лев',
+            'last_name': '',
+            'posts_count': settings.NUMBER_POSTS + 3,
+            'followers_count': 1,
+            'following_count': 0,
+        })
+
+    def test_missing_objects_are_json_404(self):
+        for name, kwargs in (
+            ('post_detail', {'post_id': 0}),
+            ('comment_list', {'post_id': 0}),
+            ('group_detail', {'slug': 'missing'}),
+            ('group_posts', {'slug': 'missing'}),
+            ('profile_detail', {'username': 'missing'}),
+            ('profile_posts', {'username': 'missing'}),
+        ):
+            with self.subTest(name=name):
+                response, data = self.get(name, **kwargs)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('error', data)
+
+    def test_nested_lists(self):
+        _, data = self.get('comment_list', post_id=self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'],
+        )
+        _, data = self.get('group_posts', '?limit=100', slug='group1')
+        self.assertEqual(data, {'results': [], 'next': None})
+        _, data = self.get('profile_posts', '?limit=100', username='author')
+        self.assertEqual(len(data['results']), settings.NUMBER_POSTS + 3)
+        _, data = self.get('group_list', '?limit=2&fields=slug')
+        self.assertEqual(data['results'], [{'slug': 'group0'},
+                                           {'slug': 'group1'}])
+        _, data = self.get('group_list', f'?limit=2&after={data["next"]}')
+        self.assertEqual([group['slug'] for group in data['results']],
+                         ['group2'])
+
+    def test_etag_not_modified(self):
+        url = reverse('api:v1:post_list')
+        response = self.client.get(url)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        Post.objects.create(author=self.author, text='Новый')
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()['results'][0]['text'], 'Новый')
+
+    def test_rename_expires_comment_list(self):
+        """Новое имя комментатора сразу видно в списке комментариев."""
+        self.get('comment_list', post_id=self.post.pk)
+        self.reader.username = 'renamed'
+        self.reader.save()
+        _, data = self.get('comment_list', post_id=self.post.pk)
+        self.assertEqual(data['results'][0]['author'], 'renamed')
+
+    def test_query_budgets(self):
+        self.client.force_login(self.reader)
+        for name, kwargs in (
+            ('post_list', {}),
+            ('post_detail', {'post_id': self.post.pk}),
+            ('comment_list', {'post_id': self.post.pk}),
+            ('group_list', {}),
+            ('group_detail', {'slug': 'group0'}),
+            ('group_posts', {'slug': 'group0'}),
+            ('profile_detail', {'username': 'author'}),
+            ('profile_posts', {'username': 'author'}),
+        ):
+            with self.subTest(name=name):
+                cache.clear()
+                self.assertWithinQueryBudget(
+                    reverse(f'api:v1:{name}', kwargs=kwargs)
+                )
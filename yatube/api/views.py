@@ -0,0 +1,181 @@
+"""JSON API только для чтения, версия 1.
+
+Списки отдаются страницами по курсору: ``{"results": [...], "next":
+"<токен>"}``, следующая страница — ``?after=<токен>``, размер —
+``?limit=`` (до ``MAX_LIMIT``). ``?fields=`` выбирает поля ответа.
+``ETag``, ответы 304, кэш и чтение из реплик — общие со страницами
+сайта (``posts.page_cache.shared_page_cache``).
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, JsonResponse
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.queries import query_budget
+from posts.models import Comment, Group, Post, User
+from posts.page_cache import (comment_scopes, group_scopes, index_scopes,
+                              post_scopes, profile_scopes, shared_page_cache)
+from posts.utils import decode_cursor, keyset_slice, make_cursor
+
+from .projections import COMMENTS, GROUPS, POSTS, PROFILES, ApiError
+
+MAX_LIMIT = 100
+COMPACT = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def api_view(view):
+    """Превращает результат вью в JSON, а ошибки — в JSON с кодом."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except ApiError as error:
+            return error.response()
+        except (Http404, ObjectDoesNotExist):
+            return JsonResponse({'error': 'Не найдено'}, status=404)
+        return JsonResponse(data, json_dumps_params=COMPACT)
+    return wrapper
+
+
+def limit_of(request):
+    raw = request.GET.get('limit')
+    if raw is None:
+        return settings.NUMBER_POSTS
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def after_of(request, decode):
+    token = request.GET.get('after')
+    if not token:
+        return None
+    cursor = decode(token)
+    if cursor is None:
+        raise ApiError('Некорректный курсор after')
+    return cursor
+
+
+def encode_id(pk):
+    return urlsafe_base64_encode(str(pk).encode())
+
+
+def decode_id(token):
+    try:
+        return int(urlsafe_base64_decode(token).decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(request, projection, queryset, keys, descending=True):
+    """Страница по ключу ``keys`` (дата, id) от курсора ``?after=``."""
+    names = projection.names(request)
+    limit = limit_of(request)
+    rows = keyset_slice(
+        projection.values(queryset, names, extra=keys),
+        limit + 1,
+        after=after_of(request, decode_cursor),
+        keys=keys,
+        descending=descending,
+    )
+    return page(
+        projection, names, rows, limit, lambda row: make_cursor(*row[-2:])
+    )
+
+
+def page(projection, names, rows, limit, cursor):
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': [projection.serialize(names, row) for row in rows],
+        'next': cursor(rows[-1]) if has_next else None,
+    }
+
+
+def detail(projection, request, queryset):
+    names = projection.names(request)
+    return projection.serialize(names, projection.values(
+        queryset, names
+    ).get())
+
+
+def post_page(request, posts):
+    return keyset_page(request, POSTS, posts, keys=('pub_date', 'id'))
+
+
+@query_budget(1)
+@shared_page_cache(index_scopes)
+@api_view
+def post_list(request):
+    return post_page(request, Post.objects.all())
+
+
+@query_budget(3)
+@shared_page_cache(group_scopes)
+@api_view
+def group_posts(request, slug):
+    group_id = Group.objects.values_list('pk', flat=True).get(slug=slug)
+    return post_page(request, Post.objects.filter(group_id=group_id))
+
+
+@query_budget(3)
+@shared_page_cache(profile_scopes)
+@api_view
+def profile_posts(request, username):
+    author_id = User.objects.values_list('pk', flat=True).get(
+        username=username
+    )
+    return post_page(request, Post.objects.filter(author_id=author_id))
+
+
+@query_budget(2)
+@shared_page_cache(post_scopes)
+@api_view
+def post_detail(request, post_id):
+    return detail(POSTS, request, Post.objects.filter(pk=post_id))
+
+
+@query_budget(2)
+@shared_page_cache(comment_scopes)
+@api_view
+def comment_list(request, post_id):
+    Post.objects.values_list('pk', flat=True).get(pk=post_id)
+    return keyset_page(
+        request,
+        COMMENTS,
+        Comment.objects.filter(post_id=post_id),
+        keys=('created', 'id'),
+        descending=False,
+    )
+
+
+@query_budget(1)
+@shared_page_cache(index_scopes)
+@api_view
+def group_list(request):
+    names = GROUPS.names(request)
+    limit = limit_of(request)
+    groups = GROUPS.values(Group.objects.order_by('id'), names, extra=('id',))
+    after = after_of(request, decode_id)
+    if after is not None:
+        groups = groups.filter(id__gt=after)
+    rows = list(groups[:limit + 1])
+    return page(GROUPS, names, rows, limit, lambda row: encode_id(row[-1]))
+
+
+@query_budget(2)
+@shared_page_cache(group_scopes)
+@api_view
+def group_detail(request, slug):
+    return detail(GROUPS, request, Group.objects.filter(slug=slug))
+
+
+@query_budget(2)
+@shared_page_cache(profile_scopes)
+@api_view
+def profile_detail(request, username):
+    return detail(PROFILES, request, User.objects.filter(username=username))
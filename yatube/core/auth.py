@@ -0,0 +1,113 @@
+"""Пользователь запроса без обращения к ``auth_user`` на каждый запрос.
+
+``AuthenticationMiddleware`` на каждый запрос авторизованного
+посетителя читает его строку из ``auth_user``. ``CachedModelBackend``
+держит поля пользователя в памяти процесса ``USER_CACHE_SECONDS``
+секунд и каждый раз собирает из них новый объект, так что запросы не
+делят один экземпляр модели.
+
+Сохранение или удаление пользователя (правка профиля, смена пароля,
+вход, блокировка) вычёркивает его из кэша своего процесса и меняет
+метку пользователя в общем кэше (``core.sqlite_cache``). Запись кэша
+процесса хранит метку, с которой она читалась из базы, и при
+расхождении не используется: другие процессы перечитают пользователя
+на следующем же запросе, и старые сеансы после смены пароля не живут.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+User = get_user_model()
+
+_users = {}
+_lock = threading.Lock()
+
+
+def ttl():
+    return getattr(settings, 'USER_CACHE_SECONDS', 30)
+
+
+def _fields():
+    return [field.attname for field in User._meta.concrete_fields]
+
+
+def stamp_key(pk):
+    return f'auth:user:{pk}'
+
+
+def stamp(pk):
+    """Метка версии пользователя в общем кэше, ``None`` — не менялся."""
+    return cache.get(stamp_key(pk))
+
+
+def bump(pk):
+    """Сбрасывает записи пользователя в кэшах всех процессов."""
+    cache.set(stamp_key(pk), uuid.uuid4().hex, None)
+
+
+def remember(user, version=None):
+    """Кладёт пользователя в кэш процесса.
+
+    ``version`` — метка, прочитанная до загрузки пользователя из базы:
+    если её сменили, пока он читался, запись сразу устареет.
+    """
+    names = _fields()
+    values = [getattr(user, name) for name in names]
+    with _lock:
+        _users[user.pk] = (
+            time.monotonic() + ttl(), version, user._state.db, values
+        )
+
+
+def recall(pk):
+    """Новый объект пользователя из кэша процесса или ``None``."""
+    with _lock:
+        entry = _users.get(pk)
+    if entry is None:
+        return None
+    expires, version, db, values = entry
+    if expires < time.monotonic() or version != stamp(pk):
+        forget(pk)
+        return None
+    return User.from_db(db, _fields(), values)
+
+
+def forget(pk):
+    with _lock:
+        _users.pop(pk, None)
+
+
+def clear():
+    with _lock:
+        _users.clear()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    forget(instance.pk)
+    bump(instance.pk)
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` с кэшем пользователей в памяти процесса."""
+
+    def get_user(self, user_id):
+        pk = User._meta.pk.to_python(user_id)
+        if not ttl():
+            return super().get_user(pk)
+        user = recall(pk)
+        if user is not None:
+            return user
+        version = stamp(pk)
+        user = super().get_user(pk)
+        if user is not None:
+            remember(user, version)
+        return user
@@ -0,0 +1,99 @@
+"""Маршрутизация запросов между основной базой и репликами.
+
+Все записи идут в ``default``. Чтение уходит в реплику только внутри
+``replica_reads``: вью со страницами для чтения открывают его, передав
+время последнего изменения показываемых данных, и реплика выбирается
+лишь среди синхронизированных позже. Иначе, как и вне запросов
+(команды, фоновые задачи), читается основная база.
+
+После первой записи в запросе чтение до его конца возвращается в
+основную базу, а ``StickyPrimaryMiddleware`` ещё несколько секунд
+держит на ней и следующие запросы этого посетителя — так он сразу
+видит свои посты и комментарии, даже если реплика ещё не догнала.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS
+
+from . import replicas
+
+_state = threading.local()
+
+# Отметки feed_cache хранятся с точностью до секунды, а запись видна в
+# копии только после коммита: берём запас.
+CLOCK_SLACK = 2
+
+
+def _get(name, default=None):
+    return getattr(_state, name, default)
+
+
+@contextmanager
+def request_state(sticky=False):
+    """Состояние маршрутизации на время одного HTTP-запроса."""
+    saved = _state.__dict__.copy()
+    _state.sticky = sticky
+    _state.wrote = False
+    _state.replica = None
+    try:
+        yield _state
+    finally:
+        _state.__dict__.clear()
+        _state.__dict__.update(saved)
+
+
+def fresh_replicas(since):
+    """Реплики, скопированные после ``since`` и не старше ``max_lag``."""
+    now = time.time()
+    return [
+        alias
+        for alias, synced in replicas.synced_at(*replicas.aliases()).items()
+        if synced >= since + CLOCK_SLACK and now - synced <= replicas.max_lag()
+    ]
+
+
+@contextmanager
+def replica_reads(since):
+    """Читает из свежей реплики, если она есть, иначе из основной базы.
+
+    ``since`` — время последнего изменения данных, которые покажет вью.
+    Возвращает выбранный псевдоним или ``None``.
+    """
+    alias = None
+    if replicas.aliases() and not _get('sticky') and not _get('wrote'):
+        candidates = fresh_replicas(since)
+        if candidates:
+            alias = random.choice(candidates)
+    saved = _get('replica')
+    _state.replica = alias
+    try:
+        yield alias
+    finally:
+        _state.replica = saved
+
+
+class PrimaryReplicaRouter:
+    """Записи — в ``default``, чтение — в реплику из ``replica_reads``."""
+
+    def db_for_read(self, model, **hints):
+        if _get('wrote'):
+            return DEFAULT_DB_ALIAS
+        return _get('replica') or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Записи отмечаются только внутри request_state: вне запросов
+        # читать из реплик некому.
+        if hasattr(_state, 'wrote'):
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты из них совместимы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики получают вместе с данными при синхронизации.
+        return db == DEFAULT_DB_ALIAS
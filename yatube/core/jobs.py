@@ -0,0 +1,296 @@
+"""Очередь фоновых задач в файле SQLite.
+
+Работа, которую не нужно делать внутри запроса (миниатюры, карточки
+постов, письма), ставится в очередь ``defer`` и выполняется пулом
+потоков: в веб-процессе (``JOB_WORKERS`` потоков запускаются при первой
+постановке) или отдельной командой ``manage.py run_jobs``. Очередь
+хранится в одном файле SQLite в режиме WAL, как ``core.sqlite_cache``,
+поэтому задачи переживают перезапуск и видны всем процессам на хосте.
+
+* Задача — функция верхнего уровня, в очереди хранится её путь и
+  аргументы в JSON.
+* Упавшая задача повторяется с экспоненциальной задержкой
+  (``JOB_RETRY_DELAY``, ``JOB_RETRY_MAX_DELAY``) до ``JOB_MAX_ATTEMPTS``
+  попыток, потом остаётся в очереди со статусом ``failed``.
+* Задача, взятая в работу, принадлежит потоку ``JOB_TIMEOUT`` секунд:
+  если процесс умер, её подберёт другой.
+* Ключ идемпотентности ``key``: пока запись о задаче хранится
+  (``JOB_KEEP_SECONDS`` после завершения), задача с тем же ключом
+  повторно не ставится.
+* ``stats`` — глубина очереди и задержки выполнения для метрик.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS jobs ('
+    'id INTEGER PRIMARY KEY, task TEXT NOT NULL, args TEXT NOT NULL, '
+    'key TEXT UNIQUE, state TEXT NOT NULL, attempts INTEGER NOT NULL, '
+    'max_attempts INTEGER NOT NULL, created REAL NOT NULL, '
+    'run_at REAL NOT NULL, started REAL, lease_until REAL, '
+    'finished REAL, error TEXT)',
+    'CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, run_at)',
+    'CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)',
+)
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+# Раз в столько завершённых задач процесс удаляет старые записи.
+PURGE_EVERY = 100
+
+_local = threading.local()
+_wakeup = threading.Event()
+_stopping = threading.Event()
+_threads = []
+_threads_lock = threading.Lock()
+_finished = 0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def path():
+    return _setting(
+        'JOB_QUEUE_PATH', os.path.join(settings.BASE_DIR, 'jobs.sqlite3')
+    )
+
+
+def _db():
+    db = getattr(_local, 'db', None)
+    # После fork соединение родителя использовать нельзя, а в тестах
+    # путь к очереди меняется настройками.
+    if db is None or _local.key != (os.getpid(), path()):
+        directory = os.path.dirname(path())
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(
+            path(), timeout=5, isolation_level=None, check_same_thread=False
+        )
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            db.execute(statement)
+        _local.db = db
+        _local.key = (os.getpid(), path())
+    return db
+
+
+def task_name(task):
+    if isinstance(task, str):
+        return task
+    return f'{task.__module__}.{task.__qualname__}'
+
+
+def defer(task, *args, key=None, delay=0, attempts=None):
+    """Ставит ``task(*args)`` в очередь, возвращает id задачи.
+
+    ``task`` — функция или её путь; аргументы должны сериализоваться в
+    JSON. Если задача с ключом ``key`` уже есть, возвращается её id.
+    """
+    now = time.time()
+    db = _db()
+    cursor = db.execute(
+        'INSERT INTO jobs (task, args, key, state, attempts, max_attempts, '
+        'created, run_at) VALUES (?, ?, ?, ?, 0, ?, ?, ?) '
+        'ON CONFLICT (key) DO NOTHING',
+        (
+            task_name(task), json.dumps(args), key, QUEUED,
+            attempts or _setting('JOB_MAX_ATTEMPTS', 5), now, now + delay,
+        ),
+    )
+    if not cursor.rowcount:
+        return db.execute(
+            'SELECT id FROM jobs WHERE key = ?', (key,)
+        ).fetchone()[0]
+    workers = _setting('JOB_WORKERS', 2)
+    if workers:
+        start(workers)
+    _wakeup.set()
+    return cursor.lastrowid
+
+
+def claim():
+    """Берёт в работу первую готовую задачу или возвращает ``None``."""
+    now = time.time()
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        row = db.execute(
+            'UPDATE jobs SET state = ?, attempts = attempts + 1, '
+            'started = ?, lease_until = ? WHERE id = ('
+            'SELECT id FROM jobs WHERE (state = ? AND run_at <= ?) '
+            'OR (state = ? AND lease_until <= ?) '
+            'ORDER BY run_at, id LIMIT 1'
+            ') RETURNING id, task, args, attempts, max_attempts',
+            (
+                RUNNING, now, now + _setting('JOB_TIMEOUT', 300),
+                QUEUED, now, RUNNING, now,
+            ),
+        ).fetchone()
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    return row
+
+
+def backoff(attempt):
+    """Задержка перед повтором после ``attempt``-й неудачной попытки."""
+    return min(
+        _setting('JOB_RETRY_DELAY', 5) * 2 ** (attempt - 1),
+        _setting('JOB_RETRY_MAX_DELAY', 600),
+    )
+
+
+def execute(row):
+    """Выполняет взятую задачу и записывает результат."""
+    global _finished
+    pk, task, args, attempt, max_attempts = row
+    try:
+        import_string(task)(*json.loads(args))
+    except Exception:
+        error = traceback.format_exc()
+        now = time.time()
+        if attempt < max_attempts:
+            logger.warning(
+                'Задача %s (%s) упала, попытка %s из %s',
+                pk, task, attempt, max_attempts,
+            )
+            _db().execute(
+                'UPDATE jobs SET state = ?, run_at = ?, error = ? '
+                'WHERE id = ?',
+                (QUEUED, now + backoff(attempt), error, pk),
+            )
+        else:
+            logger.error('Задача %s (%s) не выполнена:\n%s', pk, task, error)
+            _db().execute(
+                'UPDATE jobs SET state = ?, finished = ?, error = ? '
+                'WHERE id = ?',
+                (FAILED, now, error, pk),
+            )
+        return False
+    finally:
+        close_old_connections()
+    _db().execute(
+        'UPDATE jobs SET state = ?, finished = ? WHERE id = ?',
+        (DONE, time.time(), pk),
+    )
+    _finished += 1
+    if _finished % PURGE_EVERY == 0:
+        purge()
+    return True
+
+
+def run_pending(limit=None):
+    """Выполняет готовые задачи в текущем потоке, возвращает их число."""
+    count = 0
+    while limit is None or count < limit:
+        row = claim()
+        if row is None:
+            break
+        execute(row)
+        count += 1
+    return count
+
+
+def purge():
+    """Удаляет записи о задачах, завершённых дольше ``JOB_KEEP_SECONDS``."""
+    return _db().execute(
+        'DELETE FROM jobs WHERE state IN (?, ?) AND finished < ?',
+        (DONE, FAILED, time.time() - _setting('JOB_KEEP_SECONDS', 86400)),
+    ).rowcount
+
+
+def clear():
+    _db().execute('DELETE FROM jobs')
+
+
+def _work():
+    while not _stopping.is_set():
+        try:
+            row = claim()
+        except sqlite3.Error:
+            logger.exception('Очередь задач недоступна')
+            row = None
+        if row is not None:
+            execute(row)
+            continue
+        # Отложенные задачи и задачи других процессов видны только по
+        # опросу, свои новые — сразу по _wakeup.
+        _wakeup.wait(_setting('JOB_POLL_INTERVAL', 1))
+        _wakeup.clear()
+
+
+def start(count):
+    """Запускает пул из ``count`` потоков, если он ещё не запущен."""
+    with _threads_lock:
+        _threads[:] = [thread for thread in _threads if thread.is_alive()]
+        if _threads:
+            return _threads
+        _stopping.clear()
+        for number in range(count):
+            thread = threading.Thread(
+                target=_work, name=f'jobs-{number}', daemon=True
+            )
+            thread.start()
+            _threads.append(thread)
+    return _threads
+
+
+def stop(timeout=None):
+    """Останавливает пул, дав потокам закончить текущие задачи."""
+    _stopping.set()
+    _wakeup.set()
+    with _threads_lock:
+        for thread in _threads:
+            thread.join(timeout)
+        _threads.clear()
+
+
+def stats(window=None):
+    """Глубина очереди и задержки задач за последние ``window`` секунд.
+
+    ``wait`` — от момента, когда задача могла выполняться, до её
+    старта, ``run`` — время выполнения; в секундах.
+    """
+    now = time.time()
+    window = window or _setting('JOB_STATS_WINDOW', 300)
+    db = _db()
+    result = {state: 0 for state in (QUEUED, 'delayed', RUNNING, FAILED)}
+    for state, count in db.execute(
+        'SELECT CASE WHEN state = ? AND run_at > ? THEN ? ELSE state END, '
+        'count(*) FROM jobs WHERE state != ? GROUP BY 1',
+        (QUEUED, now, 'delayed', DONE),
+    ):
+        result[state] = count
+    oldest = db.execute(
+        'SELECT min(run_at) FROM jobs WHERE state = ? AND run_at <= ?',
+        (QUEUED, now),
+    ).fetchone()[0]
+    result['oldest_wait'] = round(now - oldest, 3) if oldest else 0
+    done, retried, wait_avg, wait_max, run_avg, run_max = db.execute(
+        'SELECT count(*), coalesce(sum(attempts > 1), 0), '
+        'avg(started - run_at), max(started - run_at), '
+        'avg(finished - started), max(finished - started) '
+        'FROM jobs WHERE state = ? AND finished >= ?',
+        (DONE, now - window),
+    ).fetchone()
+    result.update({
+        'done': done,
+        'retried': retried,
+        'wait_avg': round(wait_avg or 0, 3),
+        'wait_max': round(wait_max or 0, 3),
+        'run_avg': round(run_avg or 0, 3),
+        'run_max': round(run_max or 0, 3),
+    })
+    return result
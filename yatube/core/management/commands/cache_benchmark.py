@@ -0,0 +1,109 @@
+import json
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.sqlite_cache.SQLiteCache',
+}
+
+
+def make_cache(name, location):
+    backend = import_string(BACKENDS[name])
+    if name == 'sqlite':
+        location = f'{location}/cache.sqlite3'
+    return backend(location, {'OPTIONS': {'MAX_ENTRIES': 1000000}})
+
+
+def run_workload(name, location, ops, worker=0):
+    """Прогоняет set/get/get_many/incr, возвращает секунды на операцию."""
+    cache = make_cache(name, location)
+    keys = [f'bench:{worker}:{i}' for i in range(ops)]
+    value = {'text': 'x' * 200, 'id': 1}
+    timings = {}
+
+    started = time.perf_counter()
+    for key in keys:
+        cache.set(key, value, 300)
+    timings['set'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    timings['get'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for start in range(0, ops, 20):
+        cache.get_many(keys[start:start + 20])
+    timings['get_many(20)'] = time.perf_counter() - started
+
+    counter = f'bench:{worker}:counter'
+    cache.set(counter, 0, 300)
+    started = time.perf_counter()
+    for _ in range(ops):
+        cache.incr(counter)
+    timings['incr'] = time.perf_counter() - started
+    return timings
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность кэшей: LocMemCache, '
+        'FileBasedCache и общего SQLiteCache'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000)
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Число процессов, одновременно работающих с кэшем',
+        )
+        parser.add_argument(
+            '--backends',
+            default=','.join(BACKENDS),
+            help='Через запятую: ' + ', '.join(BACKENDS),
+        )
+        parser.add_argument('--json', help='Записать результаты в файл')
+
+    def handle(self, *args, **options):
+        ops, processes = options['ops'], options['processes']
+        results = {}
+        for name in options['backends'].split(','):
+            with tempfile.TemporaryDirectory() as location:
+                if processes > 1:
+                    with ProcessPoolExecutor(processes) as pool:
+                        runs = list(pool.map(
+                            run_workload,
+                            [name] * processes,
+                            [location] * processes,
+                            [ops] * processes,
+                            range(processes),
+                        ))
+                else:
+                    runs = [run_workload(name, location, ops)]
+            results[name] = {
+                operation: round(
+                    ops * processes / max(
+                        max(run[operation] for run in runs), 1e-9
+                    )
+                )
+                for operation in runs[0]
+            }
+            self.stdout.write(f'{name}: ' + ', '.join(
+                f'{operation} {rate} оп/с'
+                for operation, rate in results[name].items()
+            ))
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(
+                    {'ops': ops, 'processes': processes, 'results': results},
+                    output,
+                    indent=2,
+                )
@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+from .run_jobs import format_stats
+
+
+class Command(BaseCommand):
+    help = 'Глубина очереди core.jobs и задержки выполнения задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            type=float,
+            help='За сколько секунд считать выполненные задачи',
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести метрики в JSON'
+        )
+
+    def handle(self, *args, **options):
+        stats = jobs.stats(options['window'])
+        if options['json']:
+            self.stdout.write(json.dumps(stats))
+        else:
+            self.stdout.write(format_stats(stats))
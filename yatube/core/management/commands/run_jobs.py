@@ -0,0 +1,53 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+def format_stats(stats):
+    return (
+        'в очереди {queued} (отложено {delayed}), выполняется {running}, '
+        'упало {failed}; за окно выполнено {done}, повторов {retried}, '
+        'ожидание {wait_avg}/{wait_max} с, работа {run_avg}/{run_max} с'
+    ).format(**stats)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет задачи очереди core.jobs пулом потоков. В веб-процессе '
+        'пул тогда можно выключить: JOB_WORKERS = 0'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Выполнить готовые задачи в этом потоке и выйти',
+        )
+        parser.add_argument(
+            '--stats-interval',
+            type=float,
+            default=60,
+            help='Раз в N секунд печатать метрики очереди',
+        )
+
+    def handle(self, *args, **options):
+        if options['burst']:
+            count = jobs.run_pending()
+            self.stdout.write(f'Выполнено задач: {count}')
+            self.stdout.write(format_stats(jobs.stats()))
+            return
+        # SIGTERM от супервизора — как Ctrl+C: текущие задачи доделываются.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        jobs.start(options['workers'])
+        self.stdout.write(f'Потоков: {options["workers"]}')
+        try:
+            while True:
+                time.sleep(options['stats_interval'])
+                self.stdout.write(format_stats(jobs.stats()))
+        except KeyboardInterrupt:
+            self.stdout.write('Остановка: ждём текущие задачи')
+            jobs.stop()
@@ -0,0 +1,94 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import auth
+from core.queries import capture
+
+User = get_user_model()
+
+# Профиль: настройки, с которыми делаются запросы (None — как в проекте).
+PROFILES = {
+    'db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': [
+            'django.contrib.auth.backends.ModelBackend',
+        ],
+    },
+    'cached': None,
+}
+TABLES = ('django_session', 'auth_user')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQL-запросы и время на запрос авторизованного '
+        'посетителя: сеансы в базе и пользователь из базы против '
+        'cached_db и кэша пользователей core.auth'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='От чьего имени ходить, по умолчанию первый активный',
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес страницы, по умолчанию posts:follow_index',
+        )
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--json', help='Записать результаты в файл')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True).order_by('pk')
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Нет подходящего пользователя')
+        url = options['url'] or reverse('posts:follow_index')
+        results = {}
+        for name, overrides in PROFILES.items():
+            with override_settings(**(overrides or {})):
+                results[name] = self.run(user, url, options['requests'])
+            stats = results[name]
+            self.stdout.write(
+                f'{name}: {stats["queries"]} запросов к базе на запрос, '
+                'из них к ' + ', '.join(
+                    f'{table} {stats[table]}' for table in TABLES
+                ) + f'; {stats["ms"]} мс'
+            )
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(
+                    {'url': url, 'results': results}, output, indent=2
+                )
+
+    def run(self, user, url, count):
+        auth.clear()
+        client = Client()
+        client.force_login(user)
+        # Первый запрос заполняет кэши, в замер он не входит.
+        client.get(url)
+        statements = []
+        elapsed = 0
+        for _ in range(count):
+            with capture(record=True) as log:
+                started = time.perf_counter()
+                client.get(url)
+                elapsed += time.perf_counter() - started
+            statements.extend(sql for _, sql, _ in log.statements)
+        client.logout()
+        stats = {
+            'queries': round(len(statements) / count, 2),
+            'ms': round(elapsed / count * 1000, 2),
+        }
+        for table in TABLES:
+            stats[table] = round(
+                sum(f'"{table}"' in sql for sql in statements) / count, 2
+            )
+        return stats
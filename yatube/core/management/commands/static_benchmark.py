@@ -0,0 +1,104 @@
+import json
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from core.staticfiles import COMPRESSIBLE, compressed_variants
+
+DEFAULT_PAGES = ('posts:index', 'about:author', 'users:login')
+
+
+def asset_names(html):
+    """Имена статических файлов, на которые ссылается страница."""
+    prefix = re.escape(settings.STATIC_URL)
+    return list(dict.fromkeys(
+        re.findall(rf'(?:src|href)="{prefix}([^"?#]+)', html)
+    ))
+
+
+def unhashed(name):
+    """Исходное имя для имени из манифеста."""
+    for original, hashed in staticfiles_storage.hashed_files.items():
+        if hashed == name:
+            return original
+    return name
+
+
+def measure(name):
+    original = unhashed(name)
+    path = finders.find(original)
+    if path is None:
+        raise CommandError(f'Файл статики {name} не найден')
+    with open(path, 'rb') as source:
+        data = source.read()
+    best = len(data)
+    if name.endswith(COMPRESSIBLE):
+        best = min(
+            [len(packed) for _, _, packed in compressed_variants(data)],
+            default=best,
+        )
+    return {
+        'raw': len(data),
+        'compressed': best,
+        'immutable': staticfiles_storage.stored_name(original) != original,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает байты статики на страницах сайта: без сжатия и со '
+        'сжатыми копиями core.staticfiles, и сколько запросов '
+        'перепроверки экономит вечный кэш при повторном визите'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pages',
+            nargs='*',
+            help='Адреса страниц, по умолчанию: главная, об авторе, вход',
+        )
+        parser.add_argument('--json', help='Записать результаты в файл')
+
+    def handle(self, *args, **options):
+        pages = options['pages'] or [reverse(name) for name in DEFAULT_PAGES]
+        client = Client()
+        results = {}
+        for page in pages:
+            response = client.get(page)
+            if response.status_code != 200:
+                raise CommandError(f'{page}: статус {response.status_code}')
+            assets = {
+                name: measure(name)
+                for name in asset_names(response.content.decode())
+            }
+            raw = sum(asset['raw'] for asset in assets.values())
+            compressed = sum(
+                asset['compressed'] for asset in assets.values()
+            )
+            results[page] = {
+                'assets': len(assets),
+                'raw_bytes': raw,
+                'compressed_bytes': compressed,
+                'saved_bytes': raw - compressed,
+                'saved_percent': round(
+                    100 * (raw - compressed) / raw, 1
+                ) if raw else 0,
+                'revalidations_saved': sum(
+                    asset['immutable'] for asset in assets.values()
+                ),
+            }
+            stats = results[page]
+            self.stdout.write(
+                f'{page}: файлов {stats["assets"]}, '
+                f'{stats["raw_bytes"]} -> {stats["compressed_bytes"]} байт '
+                f'(-{stats["saved_percent"]}%), повторный визит без '
+                f'{stats["revalidations_saved"]} запросов перепроверки'
+            )
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в реплики из DATABASE_REPLICAS '
+        'через backup API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases',
+            nargs='*',
+            help='Какие реплики обновить, по умолчанию все',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять каждые N секунд, пока не прервут',
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replicas.aliases()
+        unknown = set(aliases) - set(replicas.aliases())
+        if unknown:
+            raise CommandError(
+                'Не реплики: ' + ', '.join(sorted(unknown))
+            )
+        if not aliases:
+            raise CommandError('DATABASE_REPLICAS пуст')
+        while True:
+            for alias in aliases:
+                elapsed = replicas.sync(alias)
+                self.stdout.write(f'{alias}: {elapsed * 1000:.0f} мс')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,129 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+
+from . import db_router, sessions, staticfiles
+from .queries import budget_of, capture
+
+logger = logging.getLogger('core.queries')
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и ищет среди них N+1.
+
+    Итог пишется в лог ``core.queries`` одной JSON-строкой (с уровнем
+    WARNING, если есть повторы или превышен бюджет вью), а при
+    ``SQL_STATS_HEADERS`` — ещё и в заголовки ``X-SQL-*`` ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with capture() as log:
+            response = self.get_response(request)
+        budget = getattr(request, 'query_budget', None)
+        repeated = log.repeated()
+        over_budget = budget is not None and log.count > budget
+        stats = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': log.count,
+            'sql_ms': round(log.duration * 1000, 2),
+            'budget': budget,
+            'repeated': repeated,
+        }
+        level = logging.WARNING if repeated or over_budget else logging.INFO
+        logger.log(
+            level,
+            json.dumps(stats, ensure_ascii=False),
+            extra={'sql_stats': stats},
+        )
+        if getattr(settings, 'SQL_STATS_HEADERS', settings.DEBUG):
+            response['X-SQL-Queries'] = log.count
+            response['X-SQL-Time'] = f'{log.duration * 1000:.2f}ms'
+            response['X-SQL-Repeated'] = sum(repeated.values())
+            if budget is not None:
+                response['X-SQL-Budget'] = budget
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = budget_of(view_func)
+
+
+class StickyPrimaryMiddleware:
+    """Держит чтение на основной базе после записи посетителя.
+
+    Если запрос что-то записал, ответ ставит cookie со сроком
+    ``REPLICA_STICKY_SECONDS``; пока он не истёк, ``core.db_router`` не
+    отправляет чтение этого посетителя в реплики. Стоит ставить до
+    ``SessionMiddleware``, чтобы запись сессии тоже считалась.
+    """
+    cookie_name = 'primary_until'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            until = 0
+        with db_router.request_state(sticky=until > time.time()) as state:
+            response = self.get_response(request)
+            wrote = state.wrote
+        if wrote:
+            window = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(
+                self.cookie_name,
+                str(int(time.time() + window)),
+                max_age=window,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику из ``STATIC_ROOT`` (``core.staticfiles``).
+
+    Стоит сразу после ``SecurityMiddleware``: запросы статики не
+    доходят до сессий, базы и учёта запросов. Файлы, которых нет в
+    ``STATIC_ROOT``, идут дальше по цепочке как обычно.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+
+    def __call__(self, request):
+        if (
+            settings.STATIC_ROOT
+            and request.method in ('GET', 'HEAD')
+            and request.path.startswith(self.prefix)
+        ):
+            response = staticfiles.serve(
+                request, request.path[len(self.prefix):]
+            )
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+
+class ExpiredSessionsMiddleware:
+    """Раз в ``SESSION_CLEANUP_INTERVAL`` чистит сеансы (``core.sessions``).
+
+    Проверка срока — сравнение времени в памяти процесса, так что
+    обычный запрос ничего не платит за чистку.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        sessions.clear_expired_soon()
+        return response
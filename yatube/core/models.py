@@ -10,3 +10,31 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class CountersModel(models.Model):
+    """Абстрактная модель со счётчиками.
+
+    Счётчики из ``counter_fields`` меняются только через ``F()`` и
+    ``update()``, поэтому обычный ``save()`` существующего объекта их не
+    перезаписывает устаревшими значениями из памяти.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and self.counter_fields
+            and kwargs.get('update_fields') is None
+        ):
+            skip = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in skip
+                and field.attname not in skip
+            ]
+        super().save(*args, **kwargs)
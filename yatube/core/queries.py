@@ -0,0 +1,89 @@
+"""Учёт SQL-запросов, выполненных за время обработки запроса.
+
+``QueryLog`` подключается через ``connection.execute_wrapper`` и
+записывает каждый запрос: текст без параметров (отпечаток) и время.
+Одинаковые отпечатки, повторённые много раз, почти всегда означают N+1:
+связанный объект загружается отдельно для каждой строки списка.
+
+Бюджет запросов вью объявляется декоратором ``query_budget``; его
+проверяют ``QueryBudgetMiddleware`` и тестовый помощник
+``core.testing.QueryBudgetMixin``. С ``record=True`` журнал хранит и
+сами запросы с параметрами — по ним ``core.testing.QueryPlanMixin``
+проверяет планы выполнения.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Текст запроса без параметров и с одинаковыми списками ``IN``."""
+    return _SPACES.sub(' ', _IN_LIST.sub('(%s, ...)', sql)).strip()
+
+
+def repeat_threshold():
+    return getattr(settings, 'SQL_REPEAT_THRESHOLD', 3)
+
+
+class QueryLog:
+    """Обёртка ``execute_wrapper``, копит запросы и их время."""
+
+    def __init__(self, record=False):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.record = record
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+            if self.record and not many:
+                self.statements.append(
+                    (context['connection'].alias, sql, params)
+                )
+
+    def repeated(self, threshold=None):
+        """Отпечатки, выполненные не меньше ``threshold`` раз."""
+        if threshold is None:
+            threshold = repeat_threshold()
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        }
+
+
+@contextmanager
+def capture(using=None, record=False):
+    """Записывает запросы ко всем базам (или к ``using``) в ``QueryLog``."""
+    log = QueryLog(record)
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(log))
+        yield log
+
+
+def query_budget(limit):
+    """Объявляет, сколько SQL-запросов вью может выполнить."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_of(view):
+    return getattr(view, 'query_budget', None)
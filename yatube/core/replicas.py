@@ -0,0 +1,58 @@
+"""Локальные реплики SQLite только для чтения.
+
+Реплика — копия основной базы в отдельном файле, которую обновляет
+``sync`` через backup API SQLite: копия делается целиком и согласованно,
+без остановки записи в основную базу. Время начала последней копии
+хранится в общем кэше, поэтому все процессы знают, насколько отстаёт
+каждая реплика, и ``core.db_router`` читает только из свежих.
+"""
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def max_lag():
+    """Реплику, не обновлявшуюся дольше, не читаем совсем."""
+    return getattr(settings, 'REPLICA_MAX_LAG', 60)
+
+
+def synced_key(alias):
+    return f'replica_synced:{alias}'
+
+
+def synced_at(*replicas):
+    """Время последней синхронизации реплик: ``{alias: timestamp}``."""
+    stamps = cache.get_many([synced_key(alias) for alias in replicas])
+    return {
+        alias: stamps[synced_key(alias)]
+        for alias in replicas
+        if synced_key(alias) in stamps
+    }
+
+
+def copy(source, target_path):
+    """Копирует базу из соединения ``source`` в файл ``target_path``."""
+    with closing(sqlite3.connect(target_path)) as target:
+        source.backup(target)
+
+
+def sync(alias):
+    """Обновляет реплику ``alias`` из основной базы, возвращает секунды."""
+    primary = connections[DEFAULT_DB_ALIAS]
+    target_path = connections[alias].settings_dict['NAME']
+    if target_path == primary.settings_dict['NAME']:
+        raise ValueError(f'Реплика {alias} указывает на основную базу')
+    primary.ensure_connection()
+    # Копия отражает базу на момент начала, его и запоминаем.
+    started = time.time()
+    copy(primary.connection, target_path)
+    cache.set(synced_key(alias), started, None)
+    return time.time() - started
@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с кэшем во временном каталоге.
+
+    Кэш в файле SQLite переживает перезапуски, и без этого тесты читали
+    бы фрагменты, закэшированные прошлым прогоном или dev-сервером.
+    Фоновая чистка сеансов (``core.sessions``) в тестах выключена: её
+    поток писал бы в тестовую базу параллельно с тестом. По той же
+    причине очередь ``core.jobs`` лежит во временном каталоге без пула
+    потоков: тесты выполняют задачи сами через ``jobs.run_pending``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp()
+        caches = {}
+        for alias, config in settings.CACHES.items():
+            config = dict(config)
+            if config['BACKEND'] == 'core.sqlite_cache.SQLiteCache':
+                config['LOCATION'] = f'{self._cache_dir}/{alias}.sqlite3'
+            caches[alias] = config
+        self._cache_override = override_settings(
+            CACHES=caches,
+            SESSION_CLEANUP_INTERVAL=0,
+            JOB_QUEUE_PATH=f'{self._cache_dir}/jobs.sqlite3',
+            JOB_WORKERS=0,
+        )
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
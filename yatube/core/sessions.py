@@ -0,0 +1,59 @@
+"""Фоновая чистка просроченных сеансов.
+
+С ``cached_db`` сеансы читаются из кэша, но пишутся и в таблицу
+``django_session``, которая без ``clearsessions`` растёт бесконечно.
+``clear_expired_soon`` вызывается на каждом запросе: раз в
+``SESSION_CLEANUP_INTERVAL`` секунд она удаляет просроченные сеансы в
+фоновом потоке. Какой процесс займётся чисткой, решает ``cache.add``
+общего кэша, поэтому процессы не чистят таблицу одновременно.
+"""
+import logging
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'sessions:cleanup'
+
+_next_check = 0
+
+
+def interval():
+    return getattr(settings, 'SESSION_CLEANUP_INTERVAL', 60 * 60)
+
+
+def clear_expired():
+    """Удаляет просроченные сеансы движка ``SESSION_ENGINE``."""
+    engine = import_module(settings.SESSION_ENGINE)
+    engine.SessionStore.clear_expired()
+
+
+def _clear_in_background():
+    try:
+        clear_expired()
+    except Exception:
+        logger.exception('Не удалось удалить просроченные сеансы')
+    finally:
+        close_old_connections()
+
+
+def clear_expired_soon():
+    """Запускает чистку, если подошёл срок; возвращает поток или ``None``."""
+    global _next_check
+    every = interval()
+    now = time.monotonic()
+    if not every or now < _next_check:
+        return None
+    _next_check = now + every
+    if not cache.add(LOCK_KEY, 1, every):
+        return None
+    thread = threading.Thread(
+        target=_clear_in_background, name='session-cleanup', daemon=True
+    )
+    thread.start()
+    return thread
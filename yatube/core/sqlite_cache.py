@@ -0,0 +1,253 @@
+"""Кэш в файле SQLite в режиме WAL, общий для всех процессов на хосте.
+
+``LocMemCache`` живёт внутри процесса: каждый воркер держит свою копию,
+а сброс кэша в одном воркере не виден остальным. Этот бэкенд хранит
+записи в одном файле SQLite, поэтому все процессы видят одни и те же
+значения без внешнего сервиса.
+
+* Целые числа хранятся как INTEGER, и ``incr`` — это один атомарный
+  ``UPDATE ... SET value = value + ?``; остальное хранится в pickle.
+* ``get_many``/``set_many`` работают пачками в одной транзакции.
+* Размер ограничен ``MAX_ENTRIES``: раз в ``CULL_EVERY`` записей
+  удаляются просроченные и давно не читанные записи (приближённый LRU,
+  время чтения обновляется не чаще раза в ``TOUCH_INTERVAL`` секунд).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+# Ограничение SQLite на число параметров запроса.
+CHUNK_SIZE = 500
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._cull_every = max(int(options.get('CULL_EVERY', 100)), 1)
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 1))
+        self._writes = 0
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        # После fork соединение родителя использовать нельзя.
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _encode(self, value):
+        if type(value) is int and INT_MIN <= value <= INT_MAX:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, keys):
+        """Живые записи по ключам: ``{key: value}``, с отметкой чтения."""
+        now = time.time()
+        found, stale = {}, []
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            rows = self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                'WHERE key IN ({})'.format(','.join('?' * len(chunk))),
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = self._decode(value)
+                if accessed < now - self._touch_interval:
+                    stale.append((now, key))
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+        return found
+
+    def _write(self, rows):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            rows,
+        )
+        self._writes += len(rows)
+        if self._writes >= self._cull_every:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        if not self._max_entries:
+            return
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires <= ?', [time.time()])
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            db.execute('DELETE FROM cache')
+            return
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            [count // self._cull_frequency],
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', [key, now]
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                [key, self._encode(value),
+                 self.get_backend_timeout(timeout), now],
+            ).rowcount == 1
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._write([(
+            key, self._encode(value),
+            self.get_backend_timeout(timeout), time.time(),
+        )])
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'UPDATE cache SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()],
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'DELETE FROM cache WHERE key = ?', [key]
+        ).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [key, time.time()],
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self._key(key, version)
+        now = time.time()
+        alive = 'key = ? AND (expires IS NULL OR expires > ?)'
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            updated = db.execute(
+                'UPDATE cache SET value = value + ?, accessed = ? '
+                f"WHERE {alive} AND typeof(value) = 'integer'",
+                [delta, now, cache_key, now],
+            ).rowcount
+            row = db.execute(
+                f'SELECT value FROM cache WHERE {alive}', [cache_key, now]
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(row[0])
+            if not updated:
+                value += delta
+                db.execute(
+                    'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                    [self._encode(value), now, cache_key],
+                )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    def get_many(self, keys, version=None):
+        cache_keys = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(cache_keys))
+        return {cache_keys[key]: value for key, value in found.items()}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), self._encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            self._write(rows)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return []
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время жизни потока: переоткрывать файл на
+        # каждый запрос дороже, чем держать его открытым.
+        pass
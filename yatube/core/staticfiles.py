@@ -0,0 +1,139 @@
+"""Статика с хэшами в именах, сжатыми копиями и вечным кэшем.
+
+``collectstatic`` через ``CompressedManifestStaticFilesStorage`` кладёт
+в ``STATIC_ROOT`` копии файлов с хэшем содержимого в имени
+(``bootstrap.min.3f2a….css``) и манифест ``staticfiles.json``, по
+которому ``{% static %}`` подставляет эти имена в шаблоны. Рядом с
+текстовыми файлами пишутся ``.gz`` и, если установлен пакет
+``brotli``, ``.br``.
+
+``serve`` отдаёт файлы из ``STATIC_ROOT`` (его вызывает
+``core.middleware.StaticFilesMiddleware``): выбирает сжатую копию по
+``Accept-Encoding``, а файлам с хэшем в имени ставит
+``Cache-Control: immutable`` на год — их содержимое под этим именем
+уже не изменится, и браузер не перепроверяет их при каждом визите.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.txt', '.json', '.ico')
+# Меньше этого сжатие не окупает лишний заголовок и работу клиента.
+MIN_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def encoders():
+    """Пары (суффикс файла, Content-Encoding, функция сжатия)."""
+    yield '.gz', 'gzip', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', 'br', lambda data: brotli.compress(data, quality=11)
+
+
+def compressed_variants(data):
+    """Сжатые копии ``data``, которые действительно меньше оригинала."""
+    for suffix, encoding, compress in encoders():
+        packed = compress(data)
+        if len(packed) < len(data):
+            yield suffix, encoding, packed
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Без манифеста (collectstatic не запускали — разработка, тесты)
+    # ссылки ведут на исходные имена, а не падают с ValueError.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        """Пишет сжатые копии файла ``name``, возвращает их имена."""
+        if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+            return []
+        with self.open(name) as source:
+            data = source.read()
+        if len(data) < MIN_SIZE:
+            return []
+        written = []
+        for suffix, _, packed in compressed_variants(data):
+            target = name + suffix
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(packed))
+            written.append(target)
+        return written
+
+
+def is_hashed(name):
+    """Имя из манифеста с хэшем содержимого — файл можно кэшировать вечно."""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    return name in hashed_files.values() and name not in hashed_files
+
+
+def accepted(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    return {
+        part.split(';')[0].strip() for part in header.split(',')
+    }
+
+
+def serve(request, name):
+    """Ответ с файлом ``name`` из ``STATIC_ROOT`` или ``None``."""
+    try:
+        path = safe_join(settings.STATIC_ROOT, name)
+    except (SuspiciousFileOperation, ValueError):
+        return None
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime,
+        stat.st_size,
+    ):
+        return HttpResponseNotModified()
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encodings = accepted(request)
+    served, encoding = path, None
+    # Порядок encoders(): gzip, затем br — лучшая подходящая копия
+    # оказывается последней.
+    for suffix, candidate, _ in encoders():
+        if candidate in encodings and os.path.isfile(path + suffix):
+            served, encoding = path + suffix, candidate
+    response = FileResponse(open(served, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if name.endswith(COMPRESSIBLE):
+        response['Vary'] = 'Accept-Encoding'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        IMMUTABLE if is_hashed(name) else 'public, max-age=0, must-revalidate'
+    )
+    return response
@@ -1,4 +1,5 @@
 from django import template
+from django.http import QueryDict
 
 
 register = template.Library()
@@ -7,3 +8,20 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **params):
+    """Строка запроса для ссылки пагинатора.
+
+    Сохраняет параметры текущего запроса (например, ``q`` у поиска), но
+    сбрасывает параметры пагинации и подставляет переданные.
+    """
+    request = context.get('request')
+    query = request.GET.copy() if request else QueryDict(mutable=True)
+    for key in ('page', 'after', 'before'):
+        query.pop(key, None)
+    for key, value in params.items():
+        if value:
+            query[key] = value
+    return '?' + query.urlencode()
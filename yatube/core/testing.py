@@ -0,0 +1,81 @@
+import re
+
+from django.db import connections
+from django.urls import resolve
+
+from .queries import budget_of, capture
+
+
+class QueryBudgetMixin:
+    """Помощник для ``TestCase``: проверяет бюджет запросов вью."""
+
+    def assertWithinQueryBudget(self, url, client=None, **extra):
+        """Запрашивает ``url`` и падает, если вью превысила бюджет."""
+        view = resolve(url.split('?')[0]).func
+        budget = budget_of(view)
+        if budget is None:
+            self.fail(f'У вью {view.__qualname__} не объявлен query_budget')
+        client = client or self.client
+        with capture() as log:
+            response = client.get(url, **extra)
+        if log.count > budget:
+            repeated = '\n'.join(
+                f'  {count} x {sql}'
+                for sql, count in log.repeated(threshold=2).items()
+            )
+            self.fail(
+                f'{url}: {log.count} SQL-запросов при бюджете {budget} '
+                f'({view.__qualname__})'
+                + (f'\nПовторы:\n{repeated}' if repeated else '')
+            )
+        return response
+
+
+# Полный проход по таблице без индекса и сортировка во временном B-дереве.
+# Формат строк плана: «SCAN posts_post» в SQLite 3.36+, «SCAN TABLE
+# posts_post» в более старых.
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?\w+$')
+_TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def explain(alias, sql, params):
+    """Строки ``EXPLAIN QUERY PLAN`` запроса в SQLite."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    return [
+        line for line in plan
+        if _FULL_SCAN.match(line.strip()) or _TEMP_SORT in line
+    ]
+
+
+class QueryPlanMixin:
+    """Помощник для ``TestCase``: проверяет планы запросов вью (SQLite)."""
+
+    def assertIndexedQueries(self, url, client=None, **extra):
+        """Падает, если запрос вью читает таблицу целиком или сортирует
+        результат во временном B-дереве вместо готового порядка индекса.
+        """
+        client = client or self.client
+        with capture(record=True) as log:
+            response = client.get(url, **extra)
+        failures = []
+        for alias, sql, params in log.statements:
+            if connections[alias].vendor != 'sqlite':
+                continue
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = explain(alias, sql, params)
+            if plan_problems(plan):
+                failures.append(
+                    f'  {sql}\n' + '\n'.join(f'    {line}' for line in plan)
+                )
+        if failures:
+            self.fail(
+                f'{url}: запросы без подходящего индекса:\n'
+                + '\n'.join(failures)
+            )
+        return response
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import auth, sessions
+from core.queries import capture
+
+User = get_user_model()
+
+
+class CachedUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        auth.clear()
+        self.user = User.objects.create_user(
+            username='cached', password='old-password-123'
+        )
+        self.client.force_login(self.user)
+        self.url = reverse('about:author')
+
+    def tables(self):
+        with capture(record=True) as log:
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['user'].username, 'cached')
+        return ' '.join(sql for _, sql, _ in log.statements)
+
+    def test_session_and_user_come_from_cache(self):
+        self.assertIn('auth_user', self.tables())
+        repeated = self.tables()
+        self.assertNotIn('auth_user', repeated)
+        self.assertNotIn('django_session', repeated)
+
+    def test_profile_change_invalidates_user(self):
+        self.tables()
+        self.user.first_name = 'Новое'
+        self.user.save()
+        self.assertIsNone(auth.recall(self.user.pk))
+        self.assertIn('auth_user', self.tables())
+
+    def test_change_in_other_process_invalidates_user(self):
+        self.tables()
+        # Другой процесс сменил пароль: его сигнал поменял только метку
+        # в общем кэше, кэш этого процесса не тронут.
+        User.objects.filter(pk=self.user.pk).update(password='changed')
+        auth.bump(self.user.pk)
+        self.assertIsNone(auth.recall(self.user.pk))
+        response = self.client.get(self.url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_password_change_keeps_own_session(self):
+        self.tables()
+        response = self.client.post(reverse('users:password_change'), {
+            'old_password': 'old-password-123',
+            'new_password1': 'new-password-456',
+            'new_password2': 'new-password-456',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('auth_user', self.tables())
+
+    def test_inactive_user_is_not_cached(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.get(self.url)
+        self.assertIsNone(auth.recall(self.user.pk))
+
+
+class ExpiredSessionsTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def expired_session(self):
+        return Session.objects.create(
+            session_key='expired',
+            session_data='',
+            expire_date=timezone.now() - timedelta(days=1),
+        )
+
+    @override_settings(SESSION_CLEANUP_INTERVAL=3600)
+    def test_cleanup_runs_once_per_interval(self):
+        self.expired_session()
+        sessions._next_check = 0
+        thread = sessions.clear_expired_soon()
+        self.assertIsNotNone(thread)
+        thread.join()
+        self.assertFalse(Session.objects.filter(pk='expired').exists())
+        sessions._next_check = 0
+        self.assertIsNone(sessions.clear_expired_soon())
+
+    @override_settings(SESSION_CLEANUP_INTERVAL=0)
+    def test_cleanup_can_be_disabled(self):
+        sessions._next_check = 0
+        self.assertIsNone(sessions.clear_expired_soon())
@@ -0,0 +1,84 @@
+import multiprocessing
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.sqlite_cache import SQLiteCache
+
+
+def incr_many(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set_add_delete(self):
+        """Базовые операции кэша."""
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', True))
+        self.assertIs(self.cache.get('new'), True)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('expired', 1, 0)
+        self.assertFalse(self.cache.has_key('expired'))
+        self.assertTrue(self.cache.add('expired', 2))
+
+    def test_many(self):
+        """Пакетные операции возвращают только живые ключи."""
+        self.cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'два'}
+        )
+        self.cache.delete_many(['a'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'b': 'два'})
+
+    def test_incr(self):
+        """incr работает и для целых, и для других чисел."""
+        self.cache.set('int', 1)
+        self.assertEqual(self.cache.incr('int', 5), 6)
+        self.assertEqual(self.cache.decr('int'), 5)
+        self.cache.set('float', 1.5)
+        self.assertEqual(self.cache.incr('float'), 2.5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_processes(self):
+        """Процессы видят одни и те же значения, incr атомарен."""
+        self.cache.set('counter', 0)
+        workers = [
+            multiprocessing.Process(target=incr_many, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_lru_cull(self):
+        """Размер кэша ограничен MAX_ENTRIES, вытесняются старые записи."""
+        cache = SQLiteCache(self.path, {'OPTIONS': {
+            'MAX_ENTRIES': 10, 'CULL_EVERY': 1, 'CULL_FREQUENCY': 2,
+            'TOUCH_INTERVAL': 0,
+        }})
+        for i in range(10):
+            cache.set(f'key{i}', i)
+        cache.get('key0')
+        cache.set('key10', 10)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertIsNone(cache.get('key1'))
+        self.assertLessEqual(len(cache.get_many(
+            [f'key{i}' for i in range(11)]
+        )), 10)
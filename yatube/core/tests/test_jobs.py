@@ -0,0 +1,134 @@
+import time
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import jobs
+from posts.models import User
+
+CALLS = []
+
+
+def record(value):
+    CALLS.append(value)
+
+
+def flaky(value):
+    CALLS.append(value)
+    if len(CALLS) < 2:
+        raise RuntimeError('Первая попытка падает')
+
+
+def broken():
+    raise RuntimeError('Всегда падает')
+
+
+def row(pk):
+    return jobs._db().execute(
+        'SELECT state, attempts, run_at, error FROM jobs WHERE id = ?',
+        (pk,),
+    ).fetchone()
+
+
+@override_settings(JOB_RETRY_DELAY=10, JOB_MAX_ATTEMPTS=2)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        jobs.clear()
+        CALLS.clear()
+
+    def test_defer_and_run(self):
+        jobs.defer(record, 'первая')
+        jobs.defer('core.tests.test_jobs.record', 'вторая')
+        self.assertEqual(CALLS, [])
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(CALLS, ['первая', 'вторая'])
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_idempotency_key(self):
+        first = jobs.defer(record, 1, key='однажды')
+        self.assertEqual(jobs.defer(record, 2, key='однажды'), first)
+        jobs.run_pending()
+        self.assertEqual(jobs.defer(record, 3, key='однажды'), first)
+        jobs.run_pending()
+        self.assertEqual(CALLS, [1])
+
+    def test_retry_with_backoff(self):
+        pk = jobs.defer(flaky, 'x')
+        started = time.time()
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.run_pending()
+        state, attempts, run_at, error = row(pk)
+        self.assertEqual((state, attempts), (jobs.QUEUED, 1))
+        self.assertGreaterEqual(run_at, started + 10)
+        self.assertIn('Первая попытка падает', error)
+        # Повтор ещё не наступил.
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(jobs.stats()['delayed'], 1)
+        jobs._db().execute('UPDATE jobs SET run_at = 0')
+        jobs.run_pending()
+        self.assertEqual(row(pk)[:2], (jobs.DONE, 2))
+        self.assertEqual(jobs.stats()['retried'], 1)
+
+    def test_gives_up_after_max_attempts(self):
+        pk = jobs.defer(broken)
+        with self.assertLogs('core.jobs', 'WARNING') as logs:
+            jobs.run_pending()
+            jobs._db().execute('UPDATE jobs SET run_at = 0')
+            jobs.run_pending()
+        self.assertIn('не выполнена', logs.output[-1])
+        self.assertEqual(row(pk)[:2], (jobs.FAILED, 2))
+        self.assertEqual(jobs.stats()['failed'], 1)
+
+    def test_expired_lease_is_reclaimed(self):
+        pk = jobs.defer(record, 'снова')
+        self.assertEqual(jobs.claim()[0], pk)
+        self.assertIsNone(jobs.claim())
+        # Процесс, взявший задачу, умер: аренда истекла.
+        jobs._db().execute('UPDATE jobs SET lease_until = 0')
+        jobs.run_pending()
+        self.assertEqual(row(pk)[:2], (jobs.DONE, 2))
+        self.assertEqual(CALLS, ['снова'])
+
+    def test_stats(self):
+        jobs.defer(record, 1)
+        jobs.defer(record, 2, delay=60)
+        stats = jobs.stats()
+        self.assertEqual((stats['queued'], stats['delayed']), (1, 1))
+        jobs.run_pending()
+        stats = jobs.stats()
+        self.assertEqual((stats['queued'], stats['done']), (0, 1))
+        out = StringIO()
+        call_command('job_stats', stdout=out)
+        self.assertIn('выполнено 1', out.getvalue())
+
+    def test_pool_runs_deferred_jobs(self):
+        try:
+            with override_settings(JOB_WORKERS=1):
+                jobs.defer(record, 'в фоне')
+                deadline = time.time() + 5
+                while not CALLS and time.time() < deadline:
+                    time.sleep(0.01)
+        finally:
+            jobs.stop()
+        self.assertEqual(CALLS, ['в фоне'])
+
+
+class DeferredMailTest(TestCase):
+    def setUp(self):
+        jobs.clear()
+        User.objects.create_user(
+            username='reset', email='reset@mail.ru', password='reset-123456'
+        )
+
+    def test_password_reset_mail_is_deferred(self):
+        response = self.client.post(
+            reverse('users:password_reset'), {'email': 'reset@mail.ru'}
+        )
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reset@mail.ru'])
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.queries import capture, fingerprint
+
+User = get_user_model()
+
+
+class FingerprintTest(SimpleTestCase):
+    def test_in_lists_collapse(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s)'),
+        )
+
+    def test_whitespace_is_normalized(self):
+        self.assertEqual(
+            fingerprint(' SELECT  1\n FROM t '), 'SELECT 1 FROM t'
+        )
+
+
+class QueryLogTest(TestCase):
+    def test_repeated_queries_are_detected(self):
+        users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        with capture() as log:
+            for user in users:
+                User.objects.get(pk=user.pk)
+            User.objects.count()
+        self.assertEqual(log.count, 4)
+        self.assertGreater(log.duration, 0)
+        repeated = log.repeated(threshold=3)
+        self.assertEqual(list(repeated.values()), [3])
+        self.assertEqual(log.repeated(threshold=4), {})
+
+
+@override_settings(SQL_STATS_HEADERS=True)
+class QueryBudgetMiddlewareTest(TestCase):
+    def test_stats_headers(self):
+        user = User.objects.create(username='reader')
+        self.client.force_login(user)
+        with self.assertLogs('core.queries', 'INFO') as logs:
+            response = self.client.get('/')
+        self.assertGreater(int(response['X-SQL-Queries']), 0)
+        self.assertTrue(response['X-SQL-Time'].endswith('ms'))
+        self.assertEqual(response['X-SQL-Repeated'], '0')
+        self.assertIn('X-SQL-Budget', response)
+        self.assertIn('"path": "/"', logs.output[0])
+
+    @override_settings(SQL_STATS_HEADERS=False)
+    def test_headers_can_be_disabled(self):
+        response = self.client.get('/about/author/')
+        self.assertNotIn('X-SQL-Queries', response)
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core import replicas
+from core.db_router import PrimaryReplicaRouter, replica_reads, request_state
+from core.queries import capture
+from posts.models import Post
+
+User = get_user_model()
+
+
+class CopyTest(SimpleTestCase):
+    def test_copy_uses_backup_api(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'replica.sqlite3')
+            with closing(sqlite3.connect(':memory:')) as source:
+                source.execute('CREATE TABLE t (value TEXT)')
+                source.execute("INSERT INTO t VALUES ('скопировано')")
+                source.commit()
+                replicas.copy(source, target)
+            with closing(sqlite3.connect(target)) as copy:
+                self.assertEqual(
+                    copy.execute('SELECT value FROM t').fetchall(),
+                    [('скопировано',)],
+                )
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=60)
+class RouterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+
+    def synced(self, when):
+        cache.set(replicas.synced_key('replica1'), when, None)
+
+    def read_alias(self, since):
+        with replica_reads(since=since):
+            return self.router.db_for_read(User)
+
+    def test_fresh_replica_is_read(self):
+        now = time.time()
+        self.synced(now)
+        self.assertEqual(self.read_alias(since=now - 10), 'replica1')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_stale_replicas_are_skipped(self):
+        now = time.time()
+        self.assertEqual(self.read_alias(since=now - 10), 'default')
+        self.synced(now - 5)
+        self.assertEqual(self.read_alias(since=now - 4), 'default')
+        self.synced(now - 120)
+        self.assertEqual(self.read_alias(since=now - 600), 'default')
+
+    def test_writes_pin_primary(self):
+        now = time.time()
+        self.synced(now)
+        with request_state(sticky=True):
+            self.assertEqual(self.read_alias(since=now - 10), 'default')
+        with request_state():
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertEqual(self.read_alias(since=now - 10), 'default')
+        self.assertEqual(self.read_alias(since=now - 10), 'replica1')
+
+
+class StickyPrimaryMiddlewareTest(TestCase):
+    def test_write_sets_sticky_cookie(self):
+        self.client.force_login(User.objects.create(username='writer'))
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertIn('primary_until', response.cookies)
+        self.assertNotIn(
+            'primary_until', self.client.get(reverse('posts:index')).cookies
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaReadsTest(TransactionTestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(username='author')
+        Post.objects.create(author=author, text='Пост из реплики')
+
+    def test_index_reads_fresh_replica(self):
+        cache.set(replicas.synced_key('replica1'), time.time() + 5, None)
+        with capture(using='replica1') as log:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост из реплики')
+        self.assertGreater(log.count, 0)
+
+    def test_index_skips_stale_replica(self):
+        cache.set(replicas.synced_key('replica1'), time.time() - 30, None)
+        with capture(using='replica1') as log:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост из реплики')
+        self.assertEqual(log.count, 0)
@@ -0,0 +1,77 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.staticfiles import IMMUTABLE
+
+CSS = b'body { margin: 0; padding: 0; }\n' * 40
+
+
+class CompressedManifestTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.source = tempfile.mkdtemp()
+        cls.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.source, 'css'))
+        with open(os.path.join(cls.source, 'css', 'site.css'), 'wb') as css:
+            css.write(CSS)
+        cls.settings = override_settings(
+            STATICFILES_DIRS=[cls.source], STATIC_ROOT=cls.root
+        )
+        cls.settings.enable()
+        call_command(
+            'collectstatic',
+            interactive=False,
+            verbosity=0,
+            ignore_patterns=['admin'],
+        )
+        cls.hashed = staticfiles_storage.stored_name('css/site.css')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.source, ignore_errors=True)
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_collectstatic_writes_hashed_and_gzip_copies(self):
+        self.assertRegex(self.hashed, r'^css/site\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, self.hashed + '.gz'), 'rb') as gz:
+            self.assertEqual(gzip.decompress(gz.read()), CSS)
+        self.assertEqual(
+            Template('{% load static %}{% static "css/site.css" %}').render(
+                Context()
+            ),
+            '/static/' + self.hashed,
+        )
+
+    def test_hashed_file_is_immutable_and_compressed(self):
+        response = self.client.get(
+            '/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), CSS
+        )
+
+    def test_plain_name_is_revalidated(self):
+        response = self.client.get('/static/css/site.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertEqual(b''.join(response.streaming_content), CSS)
+
+    def test_missing_manifest_entry_keeps_name(self):
+        self.assertEqual(
+            staticfiles_storage.stored_name('css/missing.css'),
+            'css/missing.css',
+        )
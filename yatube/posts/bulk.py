@@ -0,0 +1,83 @@
+"""Помощники массовой записи: пачки, ``bulk_create`` и даты."""
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+
+from . import search, timeline
+from .counters import reconcile
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def create_dated(model, objects):
+    """``bulk_create``, который не перезаписывает даты объектов.
+
+    ``bulk_create`` ставит в поля с ``auto_now_add`` текущее время
+    поверх значений объектов, поэтому даты записываются следом одним
+    ``bulk_update``. Для него объектам без ``pk`` заранее раздаются id
+    после последнего в таблице: SQLite их из ``bulk_create`` не
+    возвращает. Сигналы не шлются. Возвращает объекты с ``pk``.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    dated = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    with transaction.atomic():
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        next_id = max([last, *(obj.pk for obj in objects if obj.pk)]) + 1
+        for obj in objects:
+            if obj.pk is None:
+                obj.pk = next_id
+                next_id += 1
+        dates = [[getattr(obj, name) for name in dated] for obj in objects]
+        model.objects.bulk_create(objects)
+        if dated:
+            for obj, values in zip(objects, dates):
+                for name, value in zip(dated, values):
+                    setattr(obj, name, value)
+            model.objects.bulk_update(objects, dated)
+    return objects
+
+
+def bulk_insert(model, objects, chunk_size):
+    """Вставляет объекты пачками, возвращает их число.
+
+    Размер одного INSERT выбирается по ограничениям бэкенда,
+    ``chunk_size`` ограничивает память и длину транзакции. Даты объектов
+    записываются как есть (``create_dated``).
+    """
+    total = 0
+    for chunk in chunked(objects, chunk_size):
+        create_dated(model, chunk)
+        total += len(chunk)
+    return total
+
+
+def rebuild_derived(report=None):
+    """Пересобирает данные, которые обычно ведут сигналы моделей.
+
+    ``bulk_create`` сигналов не шлёт, поэтому после массовой записи
+    счётчики, ленты подписок и поисковый индекс строятся заново, а
+    закэшированные страницы сбрасываются. ``report`` получает названия
+    шагов, например ``self.stdout.write`` команды.
+    """
+    report = report or (lambda message: None)
+    report('Пересчёт счётчиков...')
+    reconcile()
+    report('Пересборка лент подписок...')
+    timeline.rebuild()
+    report('Пересборка поискового индекса...')
+    search.rebuild()
+    cache.clear()
@@ -0,0 +1,134 @@
+"""Готовый HTML карточек постов в лентах.
+
+Карточка (``posts/includes/posts_list.html``) почти не меняется после
+публикации, а её сборка — три ``{% url %}``, ``linebreaksbr``, дата и
+картинка — повторяется на каждой странице каждой ленты. Поэтому карточки
+хранятся в кэше готовыми, а лента собирает страницу одним
+``get_many``; отрисовываются только недостающие.
+
+Ключ карточки содержит версию — хэш всего, что карточка показывает
+(текст, дата, картинка и готовность её миниатюры, имя автора, адрес
+группы). Правка поста, смена группы или имени автора, построенные копии
+или миниатюра дают новую версию, и старая карточка просто перестаёт
+читаться. Сигналы после таких изменений строят карточки новой
+версии задачей очереди ``core.jobs`` (``schedule``), чтобы первый
+читатель получил их уже готовыми.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.utils.safestring import mark_safe
+
+from core import jobs
+
+from . import thumbnails
+from .models import Post
+
+TEMPLATE = 'posts/includes/posts_list.html'
+
+
+def timeout():
+    return getattr(settings, 'POST_CARD_TIMEOUT', 24 * 60 * 60)
+
+
+def warm_limit():
+    return getattr(settings, 'POST_CARD_WARM_LIMIT', 50)
+
+
+def version(post):
+    """Хэш полей поста, автора и группы, которые попадают в карточку.
+
+    Без копий карточка показывает готовую миниатюру или оригинал, так
+    что готовность миниатюры тоже входит в версию; ``cards`` узнаёт её
+    сразу для всей страницы.
+    """
+    thumbnails.prefetch([post])
+    author, group = post.author, post.group
+    shown = (
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        post.image_widths,
+        getattr(post, 'thumbnail_url', ''),
+        author.username,
+        author.first_name,
+        author.last_name,
+        group.slug if group else '',
+    )
+    return hashlib.md5(repr(shown).encode()).hexdigest()
+
+
+def shows_group(post, group_link):
+    # Без группы обе разновидности карточки совпадают: храним одну.
+    return group_link and post.group_id is not None
+
+
+def card_key(post, group_link=True):
+    variant = 'g' if shows_group(post, group_link) else 'n'
+    return f'post_card:{post.pk}:{variant}:{version(post)}'
+
+
+def render(post, group_link=True, template=None):
+    """HTML карточки; ``template`` — уже загруженный шаблон карточки."""
+    template = template or Engine.get_default().get_template(TEMPLATE)
+    return template.render(Context({
+        'post': post,
+        # Шаблон не ссылается на группу на странице самой группы.
+        'group': not shows_group(post, group_link),
+    }))
+
+
+def cards(posts, group_link=True, engine=None):
+    """HTML карточек ``posts`` в том же порядке.
+
+    ``posts`` — посты с загруженными ``author`` и ``group``
+    (``select_related``). Недостающие карточки отрисовываются и
+    сохраняются одним ``set_many``; шаблон карточки берётся у
+    ``engine`` один раз на всю страницу.
+    """
+    posts = list(posts)
+    # Готовность миниатюр входит в версию — одним запросом на страницу.
+    thumbnails.prefetch(posts)
+    keys = [card_key(post, group_link) for post in posts]
+    found = cache.get_many(keys)
+    template = None
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key in found:
+            continue
+        if template is None:
+            engine = engine or Engine.get_default()
+            template = engine.get_template(TEMPLATE)
+        missing[key] = render(post, group_link, template)
+    if missing:
+        cache.set_many(missing, timeout())
+        found.update(missing)
+    return [mark_safe(found[key]) for key in keys]
+
+
+def warm(posts):
+    """Строит недостающие карточки обеих разновидностей."""
+    posts = list(posts)
+    cards(posts)
+    cards([post for post in posts if post.group_id], group_link=False)
+    return len(posts)
+
+
+def warm_filtered(filters):
+    """Задача очереди: карточки последних постов по ``filters``."""
+    return warm(
+        Post.objects.select_related('author', 'group').filter(
+            **filters
+        )[:warm_limit()]
+    )
+
+
+def schedule(**filters):
+    """Ставит построение карточек постов ``filters`` в очередь задач.
+
+    Строятся только ``POST_CARD_WARM_LIMIT`` последних постов,
+    остальные отрисуются при первом показе.
+    """
+    jobs.defer(warm_filtered, filters)
@@ -0,0 +1,81 @@
+"""Денормализованные счётчики постов, комментариев, подписок и картинок.
+
+Счётчики меняются атомарно через ``F()`` из сигналов моделей, поэтому
+учитываются и каскадные удаления. ``reconcile`` пересчитывает все
+значения пакетно, если они разошлись с данными (например, после
+``bulk_create`` или ручной правки базы).
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (Comment, Follow, Group, Post, StoredImage, User,
+                     UserStats)
+
+
+def bump(model, pk, field, delta):
+    """Атомарно меняет счётчик ``field`` записи ``pk`` на ``delta``."""
+    if pk is None:
+        return
+    bump_many(model, [pk], field, delta)
+
+
+def bump_many(model, pks, field, delta):
+    """То же, что ``bump``, одним UPDATE для нескольких записей."""
+    rows = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающая запись создаётся на лету."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats.objects.get_or_create(user=user)[0]
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк ``model``, ссылающихся на внешнюю запись."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')[:1]
+        ),
+        0,
+    )
+
+
+@transaction.atomic
+def reconcile():
+    """Пересчитывает все счётчики с нуля."""
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=pk)
+            for pk in User.objects.filter(
+                stats__isnull=True,
+            ).values_list('pk', flat=True)
+        ],
+        batch_size=500,
+    )
+    UserStats.objects.update(
+        posts_count=count_of(Post, 'author'),
+        followers_count=count_of(Follow, 'author'),
+        following_count=count_of(Follow, 'user'),
+    )
+    Group.objects.update(posts_count=count_of(Post, 'group'))
+    Post.objects.update(comments_count=count_of(Comment, 'post'))
+    StoredImage.objects.bulk_create(
+        [
+            StoredImage(name=name)
+            for name in Post.objects.exclude(image='').exclude(
+                image__in=StoredImage.objects.values('pk'),
+            ).order_by().values_list('image', flat=True).distinct()
+        ],
+        batch_size=500,
+    )
+    StoredImage.objects.update(refs=count_of(Post, 'image'))
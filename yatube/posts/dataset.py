@@ -0,0 +1,185 @@
+"""Синтетический набор данных для замеров на реальных объёмах.
+
+Строки создаются ``bulk_create`` пачками по ``chunk_size`` и без
+сигналов, поэтому производные данные (счётчики, ленты подписок,
+поисковый индекс) пересобираются в конце одним проходом.
+"""
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from .bulk import bulk_insert
+from .models import Comment, Follow, Group, Post, User
+
+SEED_PASSWORD = 'seed-password'
+TEXT_POOL_SIZE = 1000
+
+
+def new_ids(model, after):
+    """Первичные ключи строк, вставленных после ``after``."""
+    return list(
+        model.objects.filter(pk__gt=after).order_by('pk').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+def popularity(count):
+    """Накопленные веса степенного распределения для ``choices``."""
+    return list(accumulate(1 / (rank + 1) for rank in range(count)))
+
+
+def last_id(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0
+
+
+class DatasetBuilder:
+    """Создаёт пользователей, группы, посты, комментарии и подписки.
+
+    ``report(model, rows, seconds)`` вызывается после каждой модели.
+    """
+
+    def __init__(self, chunk_size=5000, seed=0, days=365, report=None):
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.mixer = Mixer(commit=False)
+        self.days = days
+        self.report = report or (lambda model, rows, seconds: None)
+        self.texts = [
+            self.faker.text(max_nb_chars=300) for _ in range(TEXT_POOL_SIZE)
+        ]
+        self.now = timezone.now()
+
+    def timed(self, model, objects):
+        started = time.monotonic()
+        rows = bulk_insert(model, objects, self.chunk_size)
+        self.report(model, rows, time.monotonic() - started)
+        return rows
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.random.randrange(self.days * 24 * 60 * 60)
+        )
+
+    def users(self, count):
+        after = last_id(User)
+        # Хэш пароля считается один раз: PBKDF2 на каждого — минуты.
+        password = make_password(SEED_PASSWORD)
+        self.timed(User, (
+            self.mixer.blend(
+                User,
+                username=f'seed_{after + i}',
+                password=password,
+                is_staff=False,
+                is_superuser=False,
+                is_active=True,
+            )
+            for i in range(count)
+        ))
+        return new_ids(User, after)
+
+    def groups(self, count):
+        after = last_id(Group)
+        self.timed(Group, (
+            self.mixer.blend(
+                Group,
+                slug=f'seed-{after + i}',
+                description=self.faker.sentence(),
+            )
+            for i in range(count)
+        ))
+        return new_ids(Group, after)
+
+    def images(self, count):
+        """Сохраняет ``count`` разных картинок, возвращает их имена."""
+        names = []
+        storage = Post._meta.get_field('image').storage
+        for i in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (960, 339), color).save(buffer, 'JPEG')
+            names.append(storage.save(
+                f'posts/seed_{i}.jpg', ContentFile(buffer.getvalue())
+            ))
+        return names
+
+    def posts(self, count, user_ids, group_ids, images=(), image_ratio=0):
+        after = last_id(Post)
+        # Степенное распределение: у немногих авторов большинство постов.
+        weights = popularity(len(user_ids))
+
+        def build():
+            authors = iter(())
+            for _ in range(count):
+                author = next(authors, None)
+                if author is None:
+                    authors = iter(self.random.choices(
+                        user_ids, cum_weights=weights, k=self.chunk_size
+                    ))
+                    author = next(authors)
+                image = ''
+                if images and self.random.random() < image_ratio:
+                    image = self.random.choice(images)
+                yield Post(
+                    text=self.random.choice(self.texts),
+                    author_id=author,
+                    group_id=(
+                        self.random.choice(group_ids)
+                        if group_ids and self.random.random() < 0.7
+                        else None
+                    ),
+                    image=image,
+                    pub_date=self.random_date(),
+                )
+
+        self.timed(Post, build())
+        return new_ids(Post, after)
+
+    def comments(self, per_post, post_ids, user_ids):
+        def build():
+            for post_id in post_ids:
+                for _ in range(self.random.randint(0, 2 * per_post)):
+                    yield Comment(
+                        post_id=post_id,
+                        author_id=self.random.choice(user_ids),
+                        text=self.random.choice(self.texts)[:200],
+                        created=self.random_date(),
+                    )
+
+        return self.timed(Comment, build())
+
+    def follows(self, per_user, user_ids):
+        """Каждый подписан на ``per_user`` авторов, чаще на популярных."""
+        weights = popularity(len(user_ids))
+        existing = set(Follow.objects.values_list('user_id', 'author_id'))
+
+        def build():
+            for user_id in user_ids:
+                wanted = min(per_user, len(user_ids) - 1)
+                authors = set()
+                while len(authors) < wanted:
+                    for author in self.random.choices(
+                        user_ids,
+                        cum_weights=weights,
+                        k=wanted - len(authors),
+                    ):
+                        if author != user_id:
+                            authors.add(author)
+                for author in authors:
+                    if (user_id, author) not in existing:
+                        yield Follow(user_id=user_id, author_id=author)
+
+        return self.timed(Follow, build())
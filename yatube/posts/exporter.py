@@ -0,0 +1,97 @@
+"""Потоковая выгрузка постов в NDJSON и CSV.
+
+Посты читаются ``values_list(...).iterator(chunk_size)`` — кортежами,
+без создания объектов моделей и без загрузки всего запроса в память, —
+и сразу превращаются в строки. Строки собираются в блоки по
+``BLOCK_SIZE`` байт и, по желанию, сжимаются gzip на лету. Поля те же,
+что понимает ``posts.importer``, поэтому выгрузку можно загрузить
+обратно командой ``import_content``.
+"""
+import csv
+import json
+import zlib
+
+from .models import Post
+
+FIELDS = ('id', 'author', 'text', 'pub_date', 'group', 'image')
+COLUMNS = (
+    'id', 'author__username', 'text', 'pub_date', 'group__slug', 'image'
+)
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CHUNK_SIZE = 2000
+BLOCK_SIZE = 64 * 1024
+
+
+def export_queryset(group=None, author=None):
+    posts = Post.objects.order_by('id')
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    return posts
+
+
+def rows(queryset, chunk_size=CHUNK_SIZE):
+    values = queryset.values_list(*COLUMNS).iterator(chunk_size=chunk_size)
+    for post_id, author, text, pub_date, group, image in values:
+        yield post_id, author, text, pub_date.isoformat(), group or '', image
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+class _Line:
+    """Файл для ``csv.writer``: отдаёт записанную строку обратно."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    """Склеивает строки в блоки байтов примерно по ``size``."""
+    block, length = [], 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(block)
+            block, length = [], 0
+    if block:
+        yield b''.join(block)
+
+
+def gzipped(chunks, level=6):
+    """Сжимает поток байтов в формат gzip по мере чтения."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(queryset, fmt, compress=False):
+    """Байты выгрузки ``queryset`` в формате ``fmt``."""
+    lines = ndjson_lines if fmt == 'ndjson' else csv_lines
+    stream = blocks(lines(rows(queryset)))
+    if compress:
+        stream = gzipped(stream)
+    return stream
+
+
+def filename(scope, fmt, compress=False):
+    name = f'posts-{scope}.{fmt}'
+    return f'{name}.gz' if compress else name
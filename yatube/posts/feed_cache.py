@@ -0,0 +1,92 @@
+"""Версии кэша фрагментов лент на счётчиках поколений.
+
+Каждая область (вся лента, группа, автор, пост) хранит в кэше своё
+поколение. Сигналы моделей увеличивают поколения затронутых областей,
+а шаблоны добавляют версию в ключ ``{% cache %}``: после изменения
+старые фрагменты просто перестают читаться, поэтому таймаут кэша может
+быть долгим, а правки видны сразу.
+
+Рядом с поколением хранится время последнего изменения области: из него
+страничный кэш (``posts.page_cache``) берёт заголовок ``Last-Modified``.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GLOBAL = 'global'
+GROUP = 'group'
+AUTHOR = 'author'
+POST = 'post'
+
+
+def timeout():
+    return getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60)
+
+
+def scope_key(scope, pk=None):
+    if pk is None:
+        return f'feed_gen:{scope}'
+    return f'feed_gen:{scope}:{pk}'
+
+
+def modified_key(scope, pk=None):
+    if pk is None:
+        return f'feed_mtime:{scope}'
+    return f'feed_mtime:{scope}:{pk}'
+
+
+def _fresh_generation():
+    # Поколение от времени, а не с единицы: если счётчик вытеснят из
+    # кэша, новое значение не совпадёт со старыми версиями фрагментов.
+    return int(time.time() * 1000)
+
+
+def version(*scopes):
+    """Версия фрагмента, зависящего от областей ``(scope, pk)``."""
+    keys = [scope_key(*scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _fresh_generation(), None)
+            generations[key] = cache.get(key)
+    return '.'.join(str(generations[key]) for key in keys)
+
+
+def last_modified(*scopes):
+    """Время последнего изменения областей, секунды от эпохи."""
+    keys = [modified_key(*scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            # Отметка вытеснена: считаем, что область изменилась сейчас.
+            cache.add(key, int(time.time()), None)
+            stamps[key] = cache.get(key)
+    return max(stamps.values())
+
+
+def bump(*scopes):
+    """Сбрасывает фрагменты областей ``(scope, pk)``."""
+    now = int(time.time())
+    stamps = {}
+    for scope in scopes:
+        if scope[-1] is None:
+            continue
+        key = scope_key(*scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), None)
+        stamps[modified_key(*scope)] = now
+    if stamps:
+        cache.set_many(stamps, None)
+
+
+def bump_post(post, old_group_id=None):
+    bump(
+        (GLOBAL,),
+        (AUTHOR, post.author_id),
+        (GROUP, post.group_id),
+        (GROUP, old_group_id),
+        (POST, post.pk),
+    )
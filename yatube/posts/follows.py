@@ -0,0 +1,92 @@
+"""Подписка и отписка одним запросом к базе.
+
+Подписка — ``INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING``:
+автор ищется по имени в том же запросе, повтор отсекает уникальный
+индекс ``follow_unique_user_author``, а ``RETURNING`` отдаёт только
+действительно созданные строки. Поэтому одновременные клики не
+создают дублей и не требуют проверки ``exists()`` перед записью.
+Отписка — ``DELETE ... RETURNING``.
+
+По возвращённым строкам сразу для всех авторов обновляются счётчики,
+лента подписчика и кэш профилей — то же, что делают сигналы ``Follow``
+для одной подписки, но числом запросов, не зависящим от числа авторов.
+Синтаксис поддерживают SQLite 3.35+ и PostgreSQL.
+"""
+from django.db import connection, transaction
+
+from . import feed_cache, timeline
+from .counters import bump, bump_many
+from .models import Follow, User, UserStats
+
+FOLLOW = Follow._meta.db_table
+USER = User._meta.db_table
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _instances(rows, user_id):
+    return [
+        Follow(pk=pk, user_id=user_id, author_id=author_id)
+        for pk, author_id in rows
+    ]
+
+
+def _changed(user_id, author_ids, delta):
+    bump(UserStats, user_id, 'following_count', delta * len(author_ids))
+    bump_many(UserStats, author_ids, 'followers_count', delta)
+    # Профиль показывает число подписчиков автора.
+    feed_cache.bump(*[
+        (feed_cache.AUTHOR, author_id) for author_id in author_ids
+    ])
+
+
+@transaction.atomic
+def follow(user, usernames):
+    """Подписывает ``user`` на авторов ``usernames``.
+
+    Возвращает созданные подписки. Уже существующие подписки, подписка
+    на самого себя и неизвестные имена молча пропускаются.
+    """
+    usernames = list(usernames)
+    if not usernames:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FOLLOW} (user_id, author_id) '
+            f'SELECT %s, id FROM {USER} '
+            f'WHERE username IN ({_placeholders(usernames)}) AND id <> %s '
+            'ON CONFLICT DO NOTHING RETURNING id, author_id',
+            [user.pk, *usernames, user.pk],
+        )
+        created = _instances(cursor.fetchall(), user.pk)
+    if created:
+        author_ids = [row.author_id for row in created]
+        timeline.backfill(user.pk, *author_ids)
+        _changed(user.pk, author_ids, 1)
+    return created
+
+
+@transaction.atomic
+def unfollow(user, usernames):
+    """Отписывает ``user`` от авторов ``usernames``, возвращает удалённые
+    подписки."""
+    usernames = list(usernames)
+    if not usernames:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FOLLOW} WHERE user_id = %s AND author_id IN '
+            f'(SELECT id FROM {USER} '
+            f'WHERE username IN ({_placeholders(usernames)})) '
+            'RETURNING id, author_id',
+            [user.pk, *usernames],
+        )
+        deleted = _instances(cursor.fetchall(), user.pk)
+    if deleted:
+        author_ids = [row.author_id for row in deleted]
+        timeline.purge(user.pk, *author_ids)
+        _changed(user.pk, author_ids, -1)
+        timeline.followers_dropped(*author_ids)
+    return deleted
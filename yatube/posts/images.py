@@ -0,0 +1,218 @@
+"""Обработка картинок постов при загрузке.
+
+``normalize`` вызывается из ``PostForm``: картинка поворачивается по
+EXIF, сжимается до ``POST_IMAGE_MAX_SIZE`` по длинной стороне, теряет
+метаданные и анимацию (остаётся первый кадр) и пересохраняется
+прогрессивным JPEG. Так в ``media/posts`` не попадают многомегабайтные
+оригиналы.
+
+``build_renditions`` готовит копии в WebP нескольких ширин из
+``POST_IMAGE_WIDTHS`` с пропорциями карточки поста. После сохранения
+поста они строятся задачей очереди ``core.jobs`` (``schedule``), а не в
+запросе. Ширины записываются в ``Post.image_widths``, и шаблон собирает
+``srcset`` без обращений к диску: браузер сам выбирает подходящий
+размер. Пока копий нет, шаблоны показывают готовую миниатюру sorl или
+оригинал (``posts.thumbnails.prefetch``).
+
+Оригиналы лежат под именем-хэшем (``posts.storage``), и копии с
+миниатюрами получают имена от него же: у одинаковых картинок разных
+постов они общие, и ``known_widths`` позволяет не строить их повторно.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core import jobs
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'renditions'
+EXIF_ORIENTATION = 0x0112
+
+
+def max_size():
+    return getattr(settings, 'POST_IMAGE_MAX_SIZE', 1920)
+
+
+def widths():
+    return tuple(getattr(settings, 'POST_IMAGE_WIDTHS', (480, 960, 1440)))
+
+
+def ratio():
+    """Пропорции карточки поста (ширина, высота)."""
+    return getattr(settings, 'POST_IMAGE_RATIO', (960, 339))
+
+
+def quality():
+    return getattr(settings, 'POST_IMAGE_QUALITY', 82)
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def field_file(name):
+    """Файл поля ``Post.image`` по имени.
+
+    sorl ключует миниатюры по имени и классу хранилища, поэтому всем
+    вызовам ``get_thumbnail`` нужно одно и то же хранилище поля.
+    """
+    field = Post._meta.get_field('image')
+    return field.attr_class(None, field, name)
+
+
+def _flatten(image):
+    """Первый кадр в RGB; прозрачность ложится на белый фон."""
+    image.seek(0)
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def normalize(upload):
+    """Пересохраняет загруженную картинку, возвращает новый файл."""
+    upload.seek(0)
+    with Image.open(upload) as original:
+        image = _flatten(original)
+    image.thumbnail((max_size(), max_size()), Image.LANCZOS)
+    output = BytesIO()
+    # Метаданные не передаются в save(), поэтому EXIF и прочее теряется.
+    image.save(
+        output, 'JPEG', quality=quality(), optimize=True, progressive=True
+    )
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.jpg', output.getvalue(), content_type='image/jpeg'
+    )
+
+
+def rendition_name(name, width):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, RENDITIONS_DIR, f'{stem}_{width}w.webp')
+
+
+def rendition_widths(image_width):
+    """Ширины копий картинки шириной ``image_width``.
+
+    Копий шире оригинала не делаем: увеличение только утяжелит файл.
+    Картинка уже самой узкой копии получает одну копию своей ширины,
+    так что у любой прочитанной картинки ``image_widths`` не пуст и
+    задача копий для неё второй раз не ставится.
+    """
+    fitting = [width for width in sorted(widths()) if width <= image_width]
+    return fitting or [image_width]
+
+
+def _oriented_width(original):
+    """Ширина картинки после поворота по EXIF, без декодирования."""
+    width, height = original.size
+    if original.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+        return height
+    return width
+
+
+def build_renditions(name):
+    """Строит копии картинки ``name`` в WebP, возвращает их ширины."""
+    files = storage()
+    with files.open(name) as source, Image.open(source) as original:
+        image = _flatten(original)
+    ratio_width, ratio_height = ratio()
+    built = []
+    for width in rendition_widths(image.width):
+        height = max(round(width * ratio_height / ratio_width), 1)
+        rendition = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        output = BytesIO()
+        rendition.save(output, 'WEBP', quality=quality(), method=4)
+        files.save_derived(
+            rendition_name(name, width), ContentFile(output.getvalue())
+        )
+        built.append(width)
+    return built
+
+
+def render_post_image(name):
+    """Задача очереди: копии картинки ``name`` для постов без них.
+
+    Ширины записываются всем постам с этой картинкой, а их ленты и
+    страницы сбрасываются: там ещё разметка без копий.
+    """
+    posts = list(Post.objects.filter(image=name, image_widths='').only(
+        'pk', 'author_id', 'group_id'
+    ))
+    if not posts:
+        return
+    try:
+        widths = format_widths(build_renditions(name))
+    except (OSError, ValueError):
+        # Картинку не прочитать — шаблоны покажут оригинал.
+        logger.exception('Не удалось построить копии %s', name)
+        return
+    Post.objects.filter(
+        pk__in=[post.pk for post in posts], image=name
+    ).update(image_widths=widths)
+    for post in posts:
+        feed_cache.bump_post(post)
+
+
+def schedule(name):
+    """Ставит построение копий картинки в очередь задач."""
+    if name:
+        return jobs.defer(render_post_image, name)
+
+
+def known_widths(name, exclude=None):
+    """Ширины копий, уже построенных для той же картинки другого поста."""
+    return Post.objects.filter(image=name).exclude(pk=exclude).exclude(
+        image_widths=''
+    ).values_list('image_widths', flat=True).first()
+
+
+def delete(name):
+    """Удаляет оригинал картинки вместе с копиями и миниатюрами."""
+    files = storage()
+    delete_thumbnails(field_file(name), delete_file=False)
+    built = set(widths())
+    try:
+        with files.open(name) as source, Image.open(source) as original:
+            built.update(rendition_widths(_oriented_width(original)))
+    except (OSError, ValueError):
+        pass
+    for width in built:
+        files.delete(rendition_name(name, width))
+    files.delete(name)
+
+
+def parse_widths(value):
+    return [int(width) for width in value.split(',') if width]
+
+
+def format_widths(values):
+    return ','.join(str(width) for width in values)
+
+
+def srcset(name, value):
+    """Значение атрибута ``srcset`` по ``Post.image_widths``."""
+    files = storage()
+    return ', '.join(
+        f'{files.url(rendition_name(name, width))} {width}w'
+        for width in parse_widths(value)
+    )
+
+
+def src(name, value):
+    """Самая широкая копия — для браузеров без ``srcset``."""
+    return storage().url(rendition_name(name, parse_widths(value)[-1]))
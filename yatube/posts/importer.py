@@ -0,0 +1,350 @@
+"""Потоковый импорт постов, комментариев и подписок из NDJSON и CSV.
+
+Файл читается построчно, строки превращаются в объекты моделей и
+пишутся ``bulk_create`` пачками; каждая пачка — отдельная транзакция,
+в которой заодно сдвигается ``ImportCheckpoint`` и обновляется то, что
+обычно ведут сигналы: счётчики, ленты подписок и поисковый индекс, но
+только для записей пачки. Авторы и группы ищутся по словарям
+``username``/``slug`` → ``id``, загруженным один раз.
+
+Поля строк:
+
+* посты — ``author``, ``text``, ``pub_date``, ``group``, ``image``, ``id``;
+* комментарии — ``post``, ``author``, ``text``, ``created``, ``id``;
+* подписки — ``user``, ``author``.
+
+``id``, даты, группа и картинка необязательны. Строки с ошибками
+пропускаются; в отчёт попадают первые ``MAX_ERRORS`` из них и общее
+число, так что память не растёт и на почти целиком битом файле.
+"""
+import csv
+import hashlib
+import json
+import os
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feed_cache, search, timeline
+from .bulk import chunked, create_dated
+from .counters import count_of
+from .models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                     StoredImage, User, UserStats)
+
+FORMATS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+MAX_ERRORS = 100
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(
+            f'Не удалось определить формат {path}: ожидается '
+            + ', '.join(FORMATS)
+        )
+    return FORMATS[extension]
+
+
+def read_rows(path, fmt):
+    """Строки файла по одной; битая строка — ``ValueError``."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            yield from _csv_rows(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield ValueError(f'некорректный JSON: {error}')
+                continue
+            if not isinstance(row, dict):
+                yield ValueError('строка должна быть объектом JSON')
+                continue
+            yield row
+
+
+def _csv_rows(source):
+    reader = csv.DictReader(source)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            # Слишком длинное поле и т. п.: читатель продолжит со
+            # следующей строки файла.
+            yield ValueError(f'некорректный CSV: {error}')
+            continue
+        yield row
+
+
+def source_key(kind, path):
+    key = f'{kind}:{os.path.abspath(path)}'
+    if len(key) > ImportCheckpoint._meta.get_field('source').max_length:
+        key = f'{kind}:{hashlib.md5(key.encode()).hexdigest()}'
+    return key
+
+
+def _required(row, field):
+    value = row.get(field)
+    if value in (None, ''):
+        raise ValueError(f'нет поля {field}')
+    return value
+
+
+def _optional_id(row, field='id'):
+    value = row.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} должен быть числом: {value!r}')
+
+
+def _date(row, field):
+    value = row.get(field)
+    if value in (None, ''):
+        return timezone.now()
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f'не разобрать дату {field}: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _lookup(mapping, value, what):
+    try:
+        return mapping[value]
+    except KeyError:
+        raise ValueError(f'{what} {value!r}: нет в базе')
+
+
+class Importer:
+    """Превращает строки файла в объекты модели ``model``."""
+    model = None
+
+    def __init__(self):
+        self.users = dict(
+            User.objects.values_list('username', 'pk').iterator()
+        )
+
+    def author(self, row):
+        return _lookup(self.users, _required(row, 'author'), 'автор')
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def filter_chunk(self, objects):
+        """Отбрасывает объекты, которые нельзя записать (в транзакции)."""
+        return objects
+
+    def refresh(self, objects):
+        """Обновляет производные данные записанных объектов (в транзакции).
+
+        Возвращает области ``feed_cache``, которые нужно сбросить.
+        """
+        return []
+
+
+class PostImporter(Importer):
+    model = Post
+
+    def __init__(self):
+        super().__init__()
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+
+    def build(self, row):
+        group = row.get('group')
+        return Post(
+            id=_optional_id(row),
+            author_id=self.author(row),
+            text=_required(row, 'text'),
+            pub_date=_date(row, 'pub_date'),
+            group_id=(
+                _lookup(self.groups, group, 'группа') if group else None
+            ),
+            image=row.get('image') or '',
+        )
+
+    def filter_chunk(self, objects):
+        ids = [post.id for post in objects if post.id is not None]
+        existing = set(
+            Post.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        return [post for post in objects if post.id not in existing]
+
+    def refresh(self, objects):
+        ids = [post.pk for post in objects]
+        authors = {post.author_id for post in objects}
+        groups = {post.group_id for post in objects} - {None}
+        names = {post.image.name for post in objects if post.image}
+        UserStats.objects.filter(pk__in=authors).update(
+            posts_count=count_of(Post, 'author'),
+        )
+        Group.objects.filter(pk__in=groups).update(
+            posts_count=count_of(Post, 'group'),
+        )
+        if names:
+            StoredImage.objects.bulk_create(
+                [StoredImage(name=name) for name in names],
+                ignore_conflicts=True,
+            )
+            StoredImage.objects.filter(pk__in=names).update(
+                refs=count_of(Post, 'image'),
+            )
+        timeline.fan_out_many(ids)
+        search.index_many(post_ids=ids)
+        return [
+            (feed_cache.GLOBAL,),
+            *[(feed_cache.AUTHOR, author_id) for author_id in authors],
+            *[(feed_cache.GROUP, group_id) for group_id in groups],
+        ]
+
+
+class CommentImporter(Importer):
+    model = Comment
+
+    def build(self, row):
+        post_id = _optional_id(row, 'post')
+        if post_id is None:
+            raise ValueError('нет поля post')
+        return Comment(
+            id=_optional_id(row),
+            post_id=post_id,
+            author_id=self.author(row),
+            text=_required(row, 'text'),
+            created=_date(row, 'created'),
+        )
+
+    def filter_chunk(self, objects):
+        posts = set(Post.objects.filter(
+            pk__in={comment.post_id for comment in objects},
+        ).values_list('pk', flat=True))
+        ids = [comment.id for comment in objects if comment.id is not None]
+        existing = set(
+            Comment.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        return [
+            comment for comment in objects
+            if comment.post_id in posts and comment.id not in existing
+        ]
+
+    def refresh(self, objects):
+        post_ids = {comment.post_id for comment in objects}
+        Post.objects.filter(pk__in=post_ids).update(
+            comments_count=count_of(Comment, 'post'),
+        )
+        search.index_many(comment_ids=[comment.pk for comment in objects])
+        return [(feed_cache.POST, post_id) for post_id in post_ids]
+
+
+class FollowImporter(Importer):
+    model = Follow
+
+    def build(self, row):
+        user_id = _lookup(self.users, _required(row, 'user'), 'подписчик')
+        author_id = self.author(row)
+        if user_id == author_id:
+            raise ValueError('подписка на самого себя')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def filter_chunk(self, objects):
+        existing = set(Follow.objects.filter(
+            user_id__in={follow.user_id for follow in objects},
+            author_id__in={follow.author_id for follow in objects},
+        ).values_list('user_id', 'author_id'))
+        unique = []
+        for follow in objects:
+            pair = (follow.user_id, follow.author_id)
+            if pair not in existing:
+                existing.add(pair)
+                unique.append(follow)
+        return unique
+
+    def refresh(self, objects):
+        users = {follow.user_id for follow in objects}
+        authors = {follow.author_id for follow in objects}
+        UserStats.objects.filter(pk__in=users).update(
+            following_count=count_of(Follow, 'user'),
+        )
+        UserStats.objects.filter(pk__in=authors).update(
+            followers_count=count_of(Follow, 'author'),
+        )
+        timeline.backfill_follows([follow.pk for follow in objects])
+        # Профиль показывает число подписчиков автора.
+        return [(feed_cache.AUTHOR, author_id) for author_id in authors]
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
+
+
+class ImportResult:
+    def __init__(self, resumed_from):
+        self.resumed_from = resumed_from
+        self.rows = resumed_from
+        self.created = 0
+        # Первые MAX_ERRORS пар (номер строки, причина) и число всех.
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, number, reason):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((number, reason))
+
+    @property
+    def skipped(self):
+        return self.rows - self.resumed_from - self.created
+
+
+def import_rows(rows, importer, source, chunk_size=1000, restart=False,
+                report=None):
+    """Импортирует строки пачками, продолжая с ``ImportCheckpoint``.
+
+    ``report(result)`` вызывается после каждой пачки; в
+    ``result.errors`` — первые пары (номер строки, причина), в
+    ``result.error_count`` — число всех ошибок.
+    """
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+    if restart:
+        checkpoint.rows = 0
+        checkpoint.save()
+    result = ImportResult(checkpoint.rows)
+    for chunk in chunked(islice(rows, checkpoint.rows, None), chunk_size):
+        objects = []
+        for number, row in enumerate(chunk, result.rows + 1):
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                objects.append(importer.build(row))
+            except ValueError as error:
+                result.error(number, str(error))
+        with transaction.atomic():
+            objects = create_dated(
+                importer.model, importer.filter_chunk(objects)
+            )
+            scopes = importer.refresh(objects) if objects else []
+            ImportCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                rows=result.rows + len(chunk),
+                updated=timezone.now(),
+            )
+        feed_cache.bump(*scopes)
+        result.rows += len(chunk)
+        result.created += len(objects)
+        if report is not None:
+            report(result)
+    return result
@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts import images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит копии картинок постов для srcset (posts.images) '
+        'для уже загруженных картинок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить и картинки, у которых копии уже есть',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_widths='')
+        names = list(
+            posts.order_by().values_list('image', flat=True).distinct()
+        )
+        started = time.monotonic()
+        failed = 0
+        for name in names:
+            try:
+                widths = images.format_widths(images.build_renditions(name))
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            Post.objects.filter(image=name).update(image_widths=widths)
+        if names:
+            # Карточки постов закэшированы со старой разметкой.
+            cache.clear()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {len(names)} картинок, ошибок {failed}, '
+            f'{elapsed:.1f} с'
+        ))
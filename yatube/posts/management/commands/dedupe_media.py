@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail import delete as delete_thumbnails
+
+from posts import counters, images
+from posts.models import Post, StoredImage
+from posts.storage import content_hash, hashed_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит загруженные картинки постов под имена-хэши '
+        '(posts.storage): одинаковые файлы сливаются в один, посты '
+        'переводятся на него, лишние копии удаляются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет сделано',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        files = images.storage()
+        names = list(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        moved = merged = missing = saved_bytes = 0
+        for name in names:
+            try:
+                with files.open(name) as source:
+                    target = hashed_name(name, content_hash(File(source)))
+                    if target == name:
+                        continue
+                    duplicate = files.exists(target)
+                    size = files.size(name)
+                    if not dry_run and not duplicate:
+                        # Хранилище само выберет имя target по хэшу.
+                        files.save(name, File(source))
+            except OSError as error:
+                missing += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            if duplicate:
+                merged += 1
+                saved_bytes += size
+            else:
+                moved += 1
+            self.stdout.write(f'{name} -> {target}', self.style.SQL_FIELD)
+            if dry_run:
+                continue
+            with transaction.atomic():
+                Post.objects.filter(image=name).update(
+                    image=target, image_widths=''
+                )
+                StoredImage.objects.filter(pk=name).delete()
+            images.delete(name)
+            # Миниатюры, построенные ещё через хранилище по умолчанию.
+            delete_thumbnails(name, delete_file=False)
+        if not dry_run:
+            self.rebuild(files)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок {len(names)}: перенесено {moved}, '
+            f'слито с дубликатами {merged}, не найдено {missing}, '
+            f'освобождено {saved_bytes} байт'
+        ))
+
+    def rebuild(self, files):
+        """Копии для srcset, размеры файлов и число ссылок на них."""
+        names = Post.objects.exclude(image='').filter(
+            image_widths=''
+        ).order_by().values_list('image', flat=True).distinct()
+        for name in list(names):
+            try:
+                widths = images.format_widths(images.build_renditions(name))
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            Post.objects.filter(image=name).update(image_widths=widths)
+        counters.reconcile()
+        for stored in StoredImage.objects.filter(size=0).iterator():
+            if files.exists(stored.name):
+                StoredImage.objects.filter(pk=stored.pk).update(
+                    size=files.size(stored.name)
+                )
+        # Карточки постов закэшированы со старыми адресами картинок.
+        cache.clear()
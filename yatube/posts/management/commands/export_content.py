@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import exporter
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты всего сайта, группы или автора в NDJSON/CSV '
+        'потоком, по желанию со сжатием gzip'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument(
+            '--format',
+            choices=sorted(exporter.FORMATS),
+            default='ndjson',
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для выгрузки, по умолчанию stdout',
+        )
+
+    def handle(self, *args, **options):
+        filters = {}
+        try:
+            if options['group']:
+                filters['group'] = Group.objects.get(slug=options['group'])
+            if options['author']:
+                filters['author'] = User.objects.get(
+                    username=options['author']
+                )
+        except (Group.DoesNotExist, User.DoesNotExist) as error:
+            raise CommandError(error)
+        stream = exporter.export_stream(
+            exporter.export_queryset(**filters),
+            options['format'],
+            compress=options['gzip'],
+        )
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in stream:
+                output.write(chunk)
+            output.flush()
+            return
+        written = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in stream:
+                output.write(chunk)
+                written += len(chunk)
+        self.stderr.write(f'Записано {written} байт в {options["output"]}')
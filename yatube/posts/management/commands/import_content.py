@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk import rebuild_derived
+from posts.importer import (IMPORTERS, detect_format, import_rows, read_rows,
+                            source_key)
+
+SHOWN_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты, комментарии или подписки из NDJSON/CSV '
+        'пачками, с продолжением после сбоя'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .ndjson, .jsonl или .csv')
+        parser.add_argument(
+            '--kind',
+            required=True,
+            choices=sorted(IMPORTERS),
+            help='Что лежит в файле',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('ndjson', 'csv'),
+            help='Формат файла, по умолчанию — по расширению',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Строк в одной транзакции',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать файл сначала, забыв сохранённый прогресс',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать после импорта все счётчики, ленты и '
+                 'поисковый индекс, а не только для новых записей',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = options['format'] or detect_format(path)
+        except ValueError as error:
+            raise CommandError(error)
+        importer = IMPORTERS[options['kind']]()
+        self.started = time.monotonic()
+        try:
+            result = import_rows(
+                read_rows(path, fmt),
+                importer,
+                source_key(options['kind'], path),
+                chunk_size=max(options['chunk_size'], 1),
+                restart=options['restart'],
+                report=self.report,
+            )
+        except OSError as error:
+            raise CommandError(error)
+        if result.resumed_from:
+            self.stdout.write(
+                f'Продолжено со строки {result.resumed_from + 1}'
+            )
+        for number, reason in result.errors[:SHOWN_ERRORS]:
+            self.stderr.write(f'Строка {number}: {reason}')
+        if result.error_count > SHOWN_ERRORS:
+            self.stderr.write(
+                f'... и ещё {result.error_count - SHOWN_ERRORS} ошибок'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {result.created}, пропущено {result.skipped} '
+            f'из {result.rows - result.resumed_from} строк'
+        ))
+        if options['rebuild']:
+            rebuild_derived(self.stdout.write)
+
+    def report(self, result):
+        elapsed = time.monotonic() - self.started
+        processed = result.rows - result.resumed_from
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Обработано {result.rows} строк, {rate:.0f} строк/с'
+        )
@@ -0,0 +1,244 @@
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Group, Post, User
+from posts.urls import app_name, urlpatterns
+
+SAMPLE_SIZE = 100
+PERCENTILES = (50, 95, 99)
+# Адреса, которые прогон не трогает: GET по ним меняет данные
+# (подписки) или отвечает только 405 на не-POST.
+SKIPPED_ROUTES = ('profile_follow', 'profile_unfollow', 'follow_bulk')
+
+
+def percentile(ordered, q):
+    """Перцентиль по ближайшему рангу из отсортированного списка."""
+    if not ordered:
+        return None
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, statuses, seconds):
+    ordered = sorted(latencies)
+    summary = {
+        'requests': len(ordered),
+        'rps': round(len(ordered) / seconds, 1) if seconds else None,
+        'statuses': {
+            str(status): statuses.count(status)
+            for status in sorted(set(statuses))
+        },
+        'mean_ms': (
+            round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None
+        ),
+    }
+    for q in PERCENTILES:
+        value = percentile(ordered, q)
+        summary[f'p{q}_ms'] = (
+            None if value is None else round(value * 1000, 2)
+        )
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон GET-адресов posts.urls по HTTP: пропускная '
+        'способность и задержки p50/p95/p99 в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://127.0.0.1:8000',
+            help='Адрес запущенного сервера',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Запросов на каждый адрес и режим',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--routes',
+            help='Через запятую: имена адресов из posts.urls, '
+                 'по умолчанию все, кроме меняющих данные',
+        )
+        parser.add_argument(
+            '--user',
+            help='Под кем ходить в режиме authenticated; по умолчанию '
+                 'самый активный подписчик',
+        )
+        parser.add_argument('--json', default='load_test.json')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        base = urlsplit(options['base_url'])
+        self.host, self.port = base.hostname, base.port or 80
+        self.prefix = base.path.rstrip('/')
+        self.local = threading.local()
+        self.random = random.Random(options['seed'])
+        self.samples = self.load_samples()
+        cookie = self.session_cookie(options['user'])
+
+        names = [
+            pattern.name for pattern in urlpatterns
+            if pattern.name not in SKIPPED_ROUTES
+        ]
+        if options['routes']:
+            wanted = options['routes'].split(',')
+            skipped = set(wanted) & set(SKIPPED_ROUTES)
+            if skipped:
+                raise CommandError(
+                    'Эти адреса меняют данные или принимают только POST: '
+                    f'{", ".join(sorted(skipped))}'
+                )
+            unknown = set(wanted) - set(names)
+            if unknown:
+                raise CommandError(
+                    f'Нет таких адресов: {", ".join(sorted(unknown))}'
+                )
+            names = [name for name in names if name in wanted]
+
+        results = {}
+        for mode, headers in (
+            ('anonymous', {}),
+            ('authenticated', {'Cookie': cookie}),
+        ):
+            for name in names:
+                pattern = next(p for p in urlpatterns if p.name == name)
+                summary = self.drive(
+                    pattern, headers, options['requests'],
+                    options['concurrency'],
+                )
+                results[f'{name} [{mode}]'] = summary
+                self.stdout.write(
+                    f'{name} [{mode}]: {summary["rps"]} запр/с, '
+                    f'p50 {summary["p50_ms"]} мс, '
+                    f'p95 {summary["p95_ms"]} мс, '
+                    f'p99 {summary["p99_ms"]} мс, '
+                    f'коды {summary["statuses"]}'
+                )
+        with open(options['json'], 'w') as output:
+            json.dump(
+                {
+                    'base_url': options['base_url'],
+                    'started': timezone.now().isoformat(),
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'routes': results,
+                },
+                output,
+                indent=2,
+                ensure_ascii=False,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["json"]}'
+        ))
+
+    def load_samples(self):
+        """Случайные значения параметров адресов из базы."""
+        def sample(queryset, field):
+            return list(
+                queryset.order_by('?').values_list(field, flat=True)[
+                    :SAMPLE_SIZE
+                ]
+            )
+
+        samples = {
+            'slug': sample(Group.objects.all(), 'slug'),
+            'username': sample(
+                User.objects.filter(posts__isnull=False).distinct(),
+                'username',
+            ),
+            'post_id': sample(Post.objects.all(), 'pk'),
+        }
+        empty = [key for key, values in samples.items() if not values]
+        if empty:
+            raise CommandError(
+                'В базе нет данных для адресов, заполните её командой '
+                'seed_dataset'
+            )
+        return samples
+
+    def session_cookie(self, username):
+        """Сессия пользователя, созданная напрямую в базе."""
+        if username:
+            user = User.objects.get(username=username)
+        else:
+            follow = Follow.objects.values('user').annotate(
+                count=Count('author')
+            ).order_by('-count').first()
+            if follow is None:
+                user = User.objects.order_by('pk').first()
+            else:
+                user = User.objects.get(pk=follow['user'])
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def url_for(self, pattern):
+        kwargs = {
+            key: self.random.choice(self.samples[key])
+            for key in pattern.pattern.converters
+        }
+        return self.prefix + reverse(
+            f'{app_name}:{pattern.name}', kwargs=kwargs
+        )
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+            self.local.connection = connection
+        return connection
+
+    def fetch(self, url, headers):
+        started = time.perf_counter()
+        for attempt in range(2):
+            connection = self.connection()
+            try:
+                connection.request('GET', url, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Сервер закрыл keep-alive соединение: открываем новое.
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+        return time.perf_counter() - started, response.status
+
+    def drive(self, pattern, headers, count, concurrency):
+        urls = [self.url_for(pattern) for _ in range(count)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(
+                lambda url: self.fetch(url, headers), urls
+            ))
+        seconds = time.perf_counter() - started
+        return summarize(
+            [latency for latency, _ in results],
+            [status for _, status in results],
+            seconds,
+        )
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import rebuild_derived
+from posts.dataset import DatasetBuilder
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для замеров производительности'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--comments-per-post',
+            type=int,
+            default=2,
+            help='Среднее число комментариев к посту',
+        )
+        parser.add_argument(
+            '--follows-per-user',
+            type=int,
+            default=20,
+            help='На скольких авторов подписан каждый новый пользователь',
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=20,
+            help='Сколько разных картинок создать',
+        )
+        parser.add_argument(
+            '--image-ratio',
+            type=float,
+            default=0.2,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help='Не пересобирать счётчики, ленты и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        builder = DatasetBuilder(
+            chunk_size=options['chunk_size'],
+            seed=options['seed'],
+            report=self.report,
+        )
+        user_ids = builder.users(options['users'])
+        group_ids = builder.groups(options['groups'])
+        images = builder.images(options['images'])
+        post_ids = builder.posts(
+            options['posts'],
+            user_ids,
+            group_ids,
+            images=images,
+            image_ratio=options['image_ratio'],
+        )
+        builder.comments(options['comments_per_post'], post_ids, user_ids)
+        builder.follows(options['follows_per_user'], user_ids)
+        if options['skip_rebuild']:
+            return
+        rebuild_derived(self.stdout.write)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def report(self, model, rows, seconds):
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(
+            f'{model.__name__}: {rows} строк '
+            f'за {seconds:.1f} с, {rate:.0f} строк/с'
+        )
@@ -0,0 +1,136 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+
+LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Название профиля: (debug, cached.Loader, карточки уже в кэше).
+PROFILES = {
+    'dev': (True, False, False),
+    'cached-loader': (False, True, False),
+    'cached-cards': (False, True, True),
+}
+TEXT = (
+    'Лента рендерится по карточке на пост: ссылки, дата, перенос строк.\n'
+    'Вторая строка текста поста.'
+)
+
+
+def make_backend(debug, cached):
+    """Бэкенд шаблонов проекта с другим набором загрузчиков."""
+    config = settings.TEMPLATES[0]
+    loaders = LOADERS
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', LOADERS)]
+    return DjangoTemplates({
+        'NAME': 'benchmark',
+        'DIRS': config['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **config['OPTIONS'],
+            'loaders': loaders,
+            'debug': debug,
+        },
+    })
+
+
+def make_posts(count, first_pk):
+    """Несохранённые посты с авторами и группой — рендер без базы."""
+    group = Group(pk=1, title='Группа', slug='benchmark')
+    authors = [
+        User(pk=i, username=f'author{i}', first_name='Имя', last_name='Ф')
+        for i in range(1, 6)
+    ]
+    now = timezone.now()
+    return [
+        Post(
+            pk=first_pk + i,
+            text=TEXT,
+            pub_date=now,
+            author=authors[i % len(authors)],
+            group=group if i % 2 else None,
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарк рендера posts/index.html с 10/50/100 постами: '
+        'время на пост без кэша шаблонов (как при DEBUG), с '
+        'cached.Loader и с готовыми карточками posts.cards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,100')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--json', help='Записать результаты в файл')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        repeat = options['repeat']
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        results = {}
+        # Отдельный кэш в памяти: замер не зависит от общего кэша сайта
+        # и не засоряет его.
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'template-benchmark',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }}):
+            for name, (debug, cached, warm) in PROFILES.items():
+                results[name] = {}
+                template = make_backend(debug, cached).get_template(
+                    'posts/index.html'
+                )
+                for size in sizes:
+                    seconds = self.measure(
+                        template, request, size, repeat, warm
+                    )
+                    results[name][size] = round(
+                        seconds / (size * repeat) * 1e6, 1
+                    )
+                self.stdout.write(f'{name}: ' + ', '.join(
+                    f'{size} постов {per_post} мкс/пост'
+                    for size, per_post in results[name].items()
+                ))
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(
+                    {'repeat': repeat, 'results': results}, output, indent=2
+                )
+
+    def measure(self, template, request, size, repeat, warm):
+        if warm:
+            posts = make_posts(size, first_pk=1)
+            self.render(template, request, posts)
+        elapsed = 0
+        for iteration in range(repeat):
+            if not warm:
+                # Новые pk — новые ключи: каждая карточка рисуется заново.
+                posts = make_posts(size, first_pk=(iteration + 1) * 10 ** 6)
+            started = time.perf_counter()
+            self.render(template, request, posts)
+            elapsed += time.perf_counter() - started
+        return elapsed
+
+    def render(self, template, request, posts):
+        page_obj = Paginator(posts, len(posts)).page(1)
+        return template.render({
+            'page_obj': page_obj,
+            'cache_timeout': 60,
+            # Фрагмент {% cache %} страницы всегда промахивается.
+            'cache_version': f'benchmark-{time.perf_counter_ns()}',
+        }, request)
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import render_thumbnails
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для всех картинок постов (прогрев media/cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Число процессов; 0 — строить в текущем процессе',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=100,
+            help='Как часто печатать прогресс, в картинках',
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        total = len(names)
+        self.stdout.write(f'Картинок для обработки: {total}')
+        self.started = time.monotonic()
+        self.done = self.failed = 0
+        self.total = total
+        self.progress_every = max(options['progress_every'], 1)
+        if options['workers'] <= 0:
+            for name in names:
+                self.run_one(name)
+        else:
+            # Дочерним процессам нельзя делить открытые соединения с БД.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_setup_worker,
+            ) as pool:
+                futures = {
+                    pool.submit(render_thumbnails, name): name
+                    for name in names
+                }
+                for future in as_completed(futures):
+                    self.finish_one(futures[future], future.exception())
+        self.report(final=True)
+
+    def run_one(self, name):
+        try:
+            render_thumbnails(name)
+        except Exception as error:
+            self.finish_one(name, error)
+        else:
+            self.finish_one(name, None)
+
+    def finish_one(self, name, error):
+        self.done += 1
+        if error is not None:
+            self.failed += 1
+            self.stderr.write(f'{name}: {error}')
+        if self.done % self.progress_every == 0 and self.done < self.total:
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0
+        message = (
+            f'Обработано {self.done} из {self.total}, '
+            f'ошибок {self.failed}, {rate:.1f} картинок/с'
+        )
+        if final:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(message)
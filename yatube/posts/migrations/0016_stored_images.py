@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:50
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def count_image_refs(apps, schema_editor):
+    """Заводит учёт ссылок на уже загруженные картинки.
+
+    Старые файлы остаются под прежними именами; объединяет одинаковые
+    файлы команда dedupe_media.
+    """
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    StoredImage.objects.bulk_create(
+        [
+            StoredImage(name=row['image'], refs=row['total'])
+            for row in Post.objects.exclude(image='').order_by().values(
+                'image'
+            ).annotate(total=Count('pk'))
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_widths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Размер, байт')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Выберите картинку', storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_image_refs, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,14 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.models import CountersModel
+
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(CountersModel):
     title = models.CharField(
         max_length=200,
         verbose_name='Название группы',
@@ -20,6 +24,13 @@ class Group(models.Model):
         verbose_name='Описание',
         help_text='Введите описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('posts_count',)
 
     class Meta:
         verbose_name = 'Группа'
@@ -29,7 +40,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(CountersModel):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста',
@@ -58,14 +69,45 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Выберите картинку',
     )
+    image_widths = models.CharField(
+        verbose_name='Ширины копий картинки',
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text='Через запятую, копии строит posts.images',
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('comments_count',)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Сообщение'
         verbose_name_plural = 'Сообщения'
+        # Ленты идут по ключу (pub_date, id) от новых к старым: индексы
+        # отдают строки уже в этом порядке, без временной сортировки.
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='post_pub_date_id_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -96,6 +138,19 @@ class Comment(models.Model):
         help_text='Дата публикации комментария',
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx',
+            ),
+            # Комментировал ли посетитель посты страницы (posts.viewer).
+            models.Index(
+                fields=('author', 'post'),
+                name='comment_author_post_idx',
+            ),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -108,3 +163,143 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='follow_unique_user_author',
+            ),
+        )
+
+
+class UserStats(CountersModel):
+    """Хранимые счётчики пользователя вместо COUNT(*) при каждом показе."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Число подписок',
+        default=0,
+    )
+
+    counter_fields = ('posts_count', 'followers_count', 'following_count')
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx',
+            ),
+        )
+
+
+class StoredImage(CountersModel):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Имя файла — хэш содержимого (``posts.storage``), поэтому одинаковые
+    картинки разных постов хранятся одним файлом.
+    """
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Имя файла',
+    )
+    size = models.PositiveIntegerField(
+        verbose_name='Размер, байт',
+        default=0,
+    )
+    refs = models.PositiveIntegerField(
+        verbose_name='Число ссылок',
+        default=0,
+    )
+
+    counter_fields = ('refs',)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько строк файла уже импортировано командой import_content.
+
+    Обновляется в одной транзакции с пачкой строк, поэтому после сбоя
+    импорт продолжается ровно с первой незаписанной строки.
+    """
+    source = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Источник',
+    )
+    rows = models.PositiveIntegerField(
+        verbose_name='Обработано строк',
+        default=0,
+    )
+    updated = models.DateTimeField(
+        verbose_name='Обновлено',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = 'Прогресс импорта'
+        verbose_name_plural = 'Прогресс импорта'
+
+    def __str__(self):
+        return f'{self.source}: {self.rows}'
@@ -0,0 +1,154 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Гость видит одну и ту же страницу, поэтому готовый ответ можно хранить
+целиком по пути и строке запроса. Версия ответа — поколения областей
+``feed_cache``, от которых зависит страница: сигналы постов, комментариев
+и групп увеличивают их, и старые ответы перестают читаться. Из той же
+версии собирается ``ETag``, а ``Last-Modified`` — время последнего
+изменения областей, поэтому повторный запрос с ``If-None-Match`` или
+``If-Modified-Since`` получает 304 до запросов к базе за постами и
+рендеринга шаблонов.
+
+То же время изменения решает, можно ли читать страницу из реплики
+(``core.db_router.replica_reads``) — для гостей и для вошедших: реплика,
+скопированная раньше последнего изменения, показала бы старые данные
+и сохранила бы их в кэш под новой версией.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from core.db_router import replica_reads
+
+from . import feed_cache
+from .models import Group, Post, User
+
+
+def timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', feed_cache.timeout())
+
+
+def index_scopes():
+    return [(feed_cache.GLOBAL,)]
+
+
+def group_scopes(slug):
+    group_id = Group.objects.values_list('pk', flat=True).get(slug=slug)
+    return [(feed_cache.GROUP, group_id)]
+
+
+def profile_scopes(username):
+    author_id = User.objects.values_list('pk', flat=True).get(
+        username=username
+    )
+    return [(feed_cache.AUTHOR, author_id)]
+
+
+def post_scopes(post_id):
+    # Страница поста показывает ещё автора со счётчиком постов и группу.
+    author_id, group_id = Post.objects.values_list(
+        'author_id', 'group_id'
+    ).get(pk=post_id)
+    scopes = [(feed_cache.POST, post_id), (feed_cache.AUTHOR, author_id)]
+    if group_id is not None:
+        scopes.append((feed_cache.GROUP, group_id))
+    return scopes
+
+
+def comment_scopes(post_id):
+    return [(feed_cache.POST, post_id)]
+
+
+def _cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+    )
+
+
+def _set_validators(response, etag, last_modified, shared):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if not shared:
+        # Ответ зависит от сессии: залогиненный пользователь видит другое.
+        patch_vary_headers(response, ('Cookie',))
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _cached_view(view, request, args, kwargs, page_scopes, last_modified,
+                 shared):
+    version = feed_cache.version(*page_scopes)
+    digest = hashlib.md5(
+        f'{request.get_full_path()}|{version}'.encode()
+    ).hexdigest()
+    etag = quote_etag(digest)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        return _set_validators(response, etag, last_modified, shared)
+
+    key = f'page:{digest}'
+    response = cache.get(key)
+    if response is None:
+        response = view(request, *args, **kwargs)
+        # Не кэшируем ошибки и страницы с CSRF-токеном: токен у
+        # каждого посетителя свой.
+        if (
+            response.status_code == 200
+            and not response.streaming
+            and not request.META.get('CSRF_COOKIE_USED')
+        ):
+            cache.set(key, response, timeout())
+    return _set_validators(response, etag, last_modified, shared)
+
+
+def _page_cache(scopes, shared):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            try:
+                page_scopes = scopes(**kwargs)
+            except ObjectDoesNotExist:
+                return view(request, *args, **kwargs)
+            last_modified = feed_cache.last_modified(*page_scopes)
+            # Сессия и пользователь читаются до реплики: вход только что
+            # записан в основную базу и в копии его может ещё не быть.
+            cacheable = shared or _cacheable(request)
+            with replica_reads(since=last_modified):
+                if not cacheable:
+                    return view(request, *args, **kwargs)
+                return _cached_view(
+                    view, request, args, kwargs, page_scopes, last_modified,
+                    shared,
+                )
+        return wrapper
+    return decorator
+
+
+def anonymous_page_cache(scopes):
+    """Кэширует ответ вью для гостей и читает его из реплики.
+
+    ``scopes`` получает именованные аргументы вью и возвращает области
+    ``feed_cache``, от которых зависит страница. Если объект из адреса
+    не найден, запрос уходит во вью, и та сама отвечает 404.
+    """
+    return _page_cache(scopes, shared=False)
+
+
+def shared_page_cache(scopes):
+    """То же для ответов, одинаковых для всех посетителей (JSON API).
+
+    Сессия не читается вовсе, и ответ кэшируется без ``Vary: Cookie``.
+    """
+    return _page_cache(scopes, shared=True)
@@ -0,0 +1,232 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Индекс — виртуальная таблица ``posts_search``: у поста ``rowid`` равен
+``id * 2``, у комментария — ``id * 2 + 1``, поэтому обновление и удаление
+документа идут по первичному ключу индекса. На других СУБД поиск
+выключен, а функции индексации ничего не делают.
+"""
+from collections import namedtuple
+
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+from .utils import CursorPaginator
+
+SEARCH_TABLE = 'posts_search'
+SNIPPET_TOKENS = 24
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SearchHit = namedtuple(
+    'SearchHit', ('rowid', 'score', 'post', 'snippet', 'is_comment')
+)
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def post_rowid(post_id):
+    return post_id * 2
+
+
+def comment_rowid(comment_id):
+    return comment_id * 2 + 1
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 и кавычки в
+    запросе не ломают синтаксис; слова объединяются через AND.
+    """
+    terms = [
+        '"{}"'.format(term.replace('"', '""'))
+        for term in query.split()
+    ]
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и подсвечивает найденные слова."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _upsert(rowid, text, post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid]
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+            f'VALUES (%s, %s, %s)',
+            [rowid, text, post_id],
+        )
+
+
+def _remove(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid]
+        )
+
+
+def index_post(post):
+    if is_enabled():
+        _upsert(post_rowid(post.pk), post.text, post.pk)
+
+
+def remove_post(post):
+    if is_enabled():
+        _remove(post_rowid(post.pk))
+
+
+def index_comment(comment):
+    if is_enabled():
+        _upsert(comment_rowid(comment.pk), comment.text, comment.post_id)
+
+
+def remove_comment(comment):
+    if is_enabled():
+        _remove(comment_rowid(comment.pk))
+
+
+def index_many(post_ids=(), comment_ids=()):
+    """Индексирует новые посты и комментарии, по запросу на модель."""
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        for select, table, ids in (
+            ('id * 2, text, id', Post._meta.db_table, list(post_ids)),
+            (
+                'id * 2 + 1, text, post_id',
+                Comment._meta.db_table,
+                list(comment_ids),
+            ),
+        ):
+            if not ids:
+                continue
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+                f'SELECT {select} FROM {table} '
+                f'WHERE id IN ({placeholders})',
+                ids,
+            )
+
+
+@transaction.atomic
+def rebuild():
+    """Переиндексирует все посты и комментарии, возвращает число строк."""
+    if not is_enabled():
+        return 0
+    post_table = Post._meta.db_table
+    comment_table = Comment._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+            f'SELECT id * 2, text, id FROM {post_table}'
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text, post_id) '
+            f'SELECT id * 2 + 1, text, post_id FROM {comment_table}'
+        )
+        cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def matching_post_ids(query):
+    """SQL подзапроса с id постов, чей текст подходит под запрос.
+
+    Годится для ``pk__in=RawSQL(...)``; комментарии не учитываются.
+    """
+    return (
+        f'SELECT post_id FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 2 = 0',
+        [match_expression(query)],
+    )
+
+
+def encode_search_cursor(hit):
+    raw = f'{hit.score!r}|{hit.rowid}'
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_search_cursor(token):
+    try:
+        score, rowid = urlsafe_base64_decode(token).decode().split('|')
+        return float(score), int(rowid)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+class SearchPaginator(CursorPaginator):
+    """Keyset-пагинация результатов поиска по ключу (bm25, rowid).
+
+    Пост попадает в выдачу один раз — лучшим из совпадений: своим
+    текстом или одним из комментариев. Дубли отбрасываются в SQL до
+    ``LIMIT``, так что страницы полные, а курсор — ключ этого совпадения.
+
+    Вес bm25 зависит от состава индекса, поэтому при переиндексации
+    между переходами по страницам порядок может слегка сдвинуться.
+    """
+    encode = staticmethod(encode_search_cursor)
+    decode = staticmethod(decode_search_cursor)
+
+    def __init__(self, query, per_page):
+        Paginator.__init__(self, [], per_page)
+        self.match = match_expression(query)
+
+    def fetch(self, limit, after=None, before=None):
+        if not self.match or not is_enabled():
+            return []
+        where, params, order = '', [], 'ASC'
+        if after is not None:
+            score, rowid = after
+            where = 'AND (score > %s OR (score = %s AND rowid > %s))'
+            params = [score, score, rowid]
+        elif before is not None:
+            score, rowid = before
+            where = 'AND (score < %s OR (score = %s AND rowid < %s))'
+            params = [score, score, rowid]
+            order = 'DESC'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, score, post_id, snippet FROM ('
+                f'SELECT *, row_number() OVER ('
+                f'PARTITION BY post_id ORDER BY score, rowid) AS place '
+                f'FROM (SELECT rowid, bm25({SEARCH_TABLE}) AS score, '
+                f'post_id, snippet({SEARCH_TABLE}, 0, %s, %s, %s, %s) '
+                f'AS snippet FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s)'
+                f') WHERE place = 1 {where} '
+                f'ORDER BY score {order}, rowid {order} LIMIT %s',
+                [MARK_START, MARK_END, '…', SNIPPET_TOKENS, self.match,
+                 *params, limit],
+            )
+            rows = cursor.fetchall()
+        if before is not None:
+            rows.reverse()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            {post_id for _, _, post_id, _ in rows}
+        )
+        return [
+            SearchHit(
+                rowid=rowid,
+                score=score,
+                post=posts[post_id],
+                snippet=highlight(snippet),
+                is_comment=bool(rowid % 2),
+            )
+            for rowid, score, post_id, snippet in rows
+            if post_id in posts
+        ]
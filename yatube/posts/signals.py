@@ -0,0 +1,240 @@
+from django.core.files import File
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import (cards, feed_cache, images, search, stored_images,
+               thumbnails, timeline)
+from .counters import bump
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=User)
+def remember_user_names(sender, instance, **kwargs):
+    instance._saved_names = card_names(instance)
+
+
+def card_names(user):
+    # Поля автора, которые показывает карточка поста (posts.cards).
+    return tuple(
+        user.__dict__.get(field)
+        for field in ('username', 'first_name', 'last_name')
+    )
+
+
+@receiver(post_save, sender=User)
+def refresh_author_cards(sender, instance, created, raw=False, **kwargs):
+    if created or raw or card_names(instance) == instance._saved_names:
+        return
+    instance._saved_names = card_names(instance)
+    group_ids = Post.objects.filter(author=instance).exclude(
+        group=None
+    ).order_by().values_list('group_id', flat=True).distinct()
+    # Имя и ссылка на профиль есть и в комментариях к чужим постам.
+    commented_ids = Comment.objects.filter(author=instance).order_by(
+    ).values_list('post_id', flat=True).distinct()
+    feed_cache.bump(
+        (feed_cache.GLOBAL,),
+        (feed_cache.AUTHOR, instance.pk),
+        *[(feed_cache.GROUP, group_id) for group_id in group_ids],
+        *[(feed_cache.POST, post_id) for post_id in commented_ids],
+    )
+    transaction.on_commit(lambda: cards.schedule(author_id=instance.pk))
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._saved_group_id = instance.__dict__.get('group_id')
+    # Там может быть файл: храним только имя. Не сохранённая ещё
+    # загрузка в хранилище не лежит.
+    image = instance.__dict__.get('image')
+    if isinstance(image, File) and not getattr(image, '_committed', False):
+        image = None
+    instance._saved_image = getattr(image, 'name', image) or ''
+
+
+def saved_image(instance, created):
+    """Имя картинки поста до сохранения; у нового поста её не было."""
+    return '' if created else instance._saved_image
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_image(sender, instance, created, raw=False, **kwargs):
+    name = instance.image.name
+    saved = saved_image(instance, created)
+    if raw or name == saved:
+        return
+    if name:
+        stored_images.acquire(name)
+    if saved:
+        stored_images.release(saved)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_image(sender, instance, **kwargs):
+    if instance.image.name:
+        stored_images.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def build_post_renditions(sender, instance, created, raw=False, **kwargs):
+    name = instance.image.name
+    if raw or name == saved_image(instance, created):
+        return
+    # Та же картинка у другого поста: копии уже лежат под её хэшем.
+    # Иначе копии строит задача очереди, а до тех пор шаблон покажет
+    # миниатюру sorl или оригинал.
+    widths = name and images.known_widths(name, exclude=instance.pk)
+    if widths is None:
+        widths = ''
+        transaction.on_commit(lambda: images.schedule(name))
+    if widths != instance.image_widths:
+        Post.objects.filter(pk=instance.pk).update(image_widths=widths)
+        instance.image_widths = widths
+
+
+@receiver(post_save, sender=Post)
+def render_post_thumbnails(sender, instance, created, raw=False,
+                           **kwargs):
+    name = instance.image.name
+    if raw or not name or name == saved_image(instance, created):
+        return
+    transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_cards(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: cards.schedule(pk=instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bump(UserStats, instance.author_id, 'posts_count', 1)
+        bump(Group, instance.group_id, 'posts_count', 1)
+    elif instance._saved_group_id != instance.group_id:
+        bump(Group, instance._saved_group_id, 'posts_count', -1)
+        bump(Group, instance.group_id, 'posts_count', 1)
+
+
+@receiver(post_save, sender=Post)
+def expire_saved_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance, old_group_id=instance._saved_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    bump(UserStats, instance.author_id, 'posts_count', -1)
+    bump(Group, instance.group_id, 'posts_count', -1)
+
+
+@receiver(post_delete, sender=Post)
+def expire_deleted_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_feeds(sender, instance, **kwargs):
+    feed_cache.bump((feed_cache.POST, instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_group_feeds(sender, instance, **kwargs):
+    feed_cache.bump((feed_cache.GLOBAL,), (feed_cache.GROUP, instance.pk))
+
+
+@receiver(post_save, sender=Group)
+def refresh_group_cards(sender, instance, created, raw=False, **kwargs):
+    # Карточки ссылаются на группу по slug.
+    if not created and not raw:
+        transaction.on_commit(lambda: cards.schedule(group_id=instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(Post, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    bump(Post, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_author_feeds(sender, instance, raw=False, **kwargs):
+    # Профиль показывает число подписчиков автора.
+    if not raw:
+        feed_cache.bump((feed_cache.AUTHOR, instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(UserStats, instance.user_id, 'following_count', 1)
+        bump(UserStats, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def purge_timeline(sender, instance, **kwargs):
+    timeline.purge(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    bump(UserStats, instance.user_id, 'following_count', -1)
+    bump(UserStats, instance.author_id, 'followers_count', -1)
+    timeline.followers_dropped(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    search.remove_comment(instance)
+
+
+@receiver(post_save, sender=Post)
+def remember_saved_post(sender, instance, **kwargs):
+    # Подключён последним: остальные ещё видят состояние до сохранения.
+    instance._saved_group_id = instance.group_id
+    instance._saved_image = instance.image.name or ''
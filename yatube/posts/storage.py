@@ -0,0 +1,66 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого: ``posts/ab/abcdef….jpg``.
+Одинаковые загрузки получают одно и то же имя, и второй раз файл не
+пишется. Сколько постов ссылается на файл, считает ``StoredImage``;
+когда ссылок не остаётся, файл удаляется вместе с копиями для
+``srcset`` и миниатюрами. Миниатюры sorl и копии ``posts.images``
+строятся по имени файла, поэтому для дубликатов они общие и
+считаются один раз.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """``posts/x.JPG`` и хэш → ``posts/ab/<хэш>.jpg``."""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage``, который кладёт файлы по хэшу содержимого."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_hash(content))
+        if self.exists(name):
+            return name
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # Тот же файл успела сохранить параллельная загрузка, а
+            # Django дописал к имени суффикс: лишняя копия не нужна.
+            self.delete(saved)
+        return name
+
+    def save_derived(self, name, content):
+        """Сохраняет производный файл (копию картинки) ровно под ``name``.
+
+        Имя производного файла уже выведено из хэша оригинала, поэтому
+        здесь содержимое не хэшируется, а старый файл перезаписывается.
+        """
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
@@ -0,0 +1,56 @@
+"""Учёт ссылок постов на файлы картинок.
+
+Одинаковые картинки хранятся одним файлом (``posts.storage``), поэтому
+удалять файл вместе с постом нельзя: на него могут ссылаться другие
+посты. ``StoredImage.refs`` считает ссылки; сигналы ``Post`` вызывают
+``acquire`` для новой картинки и ``release`` для старой. Файл, на
+который не осталось ссылок, удаляется после коммита вместе с копиями и
+миниатюрами.
+
+Картинки, загруженные до появления учёта, строки не имеют и не
+удаляются, пока ``reconcile_counters`` не посчитает ссылки на них.
+"""
+import logging
+
+from django.db import connection, transaction
+
+from . import images
+from .counters import bump
+from .models import StoredImage
+
+logger = logging.getLogger(__name__)
+
+STORED_IMAGE = StoredImage._meta.db_table
+
+
+def acquire(name):
+    """Добавляет ссылку на файл ``name``, заводя строку при первой."""
+    try:
+        size = images.storage().size(name)
+    except OSError:
+        size = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {STORED_IMAGE} (name, size, refs) '
+            'VALUES (%s, %s, 1) '
+            'ON CONFLICT (name) DO UPDATE SET refs = refs + 1',
+            [name, size],
+        )
+
+
+def release(name):
+    """Снимает ссылку на ``name``; без ссылок файл удаляется после коммита."""
+    bump(StoredImage, name, 'refs', -1)
+    transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    # Условное удаление: если файл успел понадобиться снова, строка
+    # уже не подходит под refs=0 и файл остаётся на месте.
+    deleted, _ = StoredImage.objects.filter(pk=name, refs=0).delete()
+    if not deleted:
+        return
+    try:
+        images.delete(name)
+    except OSError:
+        logger.exception('Не удалось удалить файлы картинки %s', name)
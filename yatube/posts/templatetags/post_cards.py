@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html_join
+
+from .. import cards
+
+register = template.Library()
+
+# Флаг посетителя (posts.viewer): подпись и класс значка.
+VIEWER_FLAGS = (
+    ('viewer_is_author', 'Ваш пост', 'bg-secondary'),
+    ('viewer_follows', 'Вы подписаны на автора', 'bg-info'),
+    ('viewer_commented', 'Вы комментировали', 'bg-light text-dark'),
+)
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, group_link=True):
+    """Пары (пост, готовая карточка) страницы (``posts.cards``).
+
+    Пост рядом с карточкой нужен для флагов посетителя
+    (``viewer_flags``): в общую для всех карточку они не попадают.
+    """
+    posts = list(posts)
+    return list(zip(posts, cards.cards(
+        posts, group_link, engine=context.template.engine
+    )))
+
+
+@register.simple_tag
+def viewer_flags(post):
+    """Значки флагов посетителя у поста без отдельного шаблона."""
+    return format_html_join(' ', '<span class="badge {}">{}</span>', (
+        (css, label) for attr, label, css in VIEWER_FLAGS
+        if getattr(post, attr, False)
+    ))
@@ -0,0 +1,29 @@
+from django import template
+
+from .. import images, thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def image_srcset(post):
+    """``srcset`` из копий картинки поста."""
+    return images.srcset(post.image.name, post.image_widths)
+
+
+@register.filter
+def image_src(post):
+    return images.src(post.image.name, post.image_widths)
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post):
+    """Картинка поста: копии для ``srcset``, готовая миниатюра sorl
+    или, пока их нет, сам оригинал.
+
+    В отличие от ``{% include %}``, шаблон тега не ищется заново на
+    каждой итерации цикла, а с ``cached.Loader`` разбирается один раз
+    на процесс.
+    """
+    thumbnails.prefetch([post])
+    return {'post': post}
@@ -1,21 +1,32 @@
+import os
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from core import jobs
+from posts import feed_cache, images, stored_images, thumbnails
 from posts.forms import PostForm
-from posts.models import Group, Post, User
+from posts.models import Group, Post, StoredImage, User
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
         cls.author = User.objects.create_user(username='Test_name')
         cls.group = Group.objects.create(
             title='test_name_group',
@@ -32,7 +43,7 @@ class PostCreateFormTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self):
@@ -76,6 +87,21 @@ class PostCreateFormTests(TestCase):
                 text='Тестовый текст'
             ).exists()
         )
+        self.assertRegex(
+            Post.objects.get(text='Тестовый текст').image.name,
+            r'^posts/\w{2}/\w{64}\.jpg$',
+        )
+        out = StringIO()
+        call_command('warm_thumbnails', workers=0, stdout=out)
+        self.assertIn('Обработано 1 из 1, ошибок 0', out.getvalue())
+
+    def test_thumbnails_are_queued_once(self):
+        """Миниатюры одной картинки ставятся в очередь задач один раз."""
+        jobs.clear()
+        name = 'posts/ab/' + 'a' * 64 + '.jpg'
+        first = thumbnails.schedule(name)
+        self.assertEqual(thumbnails.schedule(name), first)
+        self.assertEqual(jobs.stats()['queued'], 1)
 
     def test_authorized_create_post(self):
         """Валидная форма создает запись в Post."""
@@ -145,3 +171,239 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(post.text == form['text'])
         self.assertTrue(post.author == self.author)
         self.assertTrue(post.group_id == form['group'])
+
+
+def image_file(name, size, fmt, mode='RGB', **options):
+    output = BytesIO()
+    Image.new(mode, size, 'red').save(output, fmt, **options)
+    return SimpleUploadedFile(name, output.getvalue())
+
+
+class TempMediaMixin:
+    """Своя временная MEDIA_ROOT на класс, удаляется после него."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=cls.media_root)
+        media.enable()
+        cls.addClassCleanup(media.disable)
+
+
+class ImagePipelineTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='photographer')
+        self.client.force_login(self.author)
+
+    def create(self, upload):
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Фото', 'image': upload}
+        )
+        post = Post.objects.get(author=self.author)
+        # TestCase не выполняет on_commit: задачу копий зовём сами.
+        images.render_post_image(post.image.name)
+        post.refresh_from_db()
+        return post
+
+    def test_upload_is_normalized(self):
+        """Картинка сжимается, теряет метаданные и становится JPEG."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        post = self.create(image_file(
+            'photo.png', (3000, 2000), 'PNG', mode='RGBA', exif=exif
+        ))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (1920, 1280))
+            self.assertTrue(stored.info.get('progressive'))
+            self.assertNotIn('exif', stored.info)
+
+    def test_renditions_and_srcset(self):
+        post = self.create(image_file('wide.jpg', (1600, 900), 'JPEG'))
+        self.assertEqual(post.image_widths, '480,960,1440')
+        for width in (480, 960, 1440):
+            name = images.rendition_name(post.image.name, width)
+            with images.storage().open(name) as source:
+                with Image.open(source) as rendition:
+                    self.assertEqual(rendition.format, 'WEBP')
+                    self.assertEqual(rendition.width, width)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, '_960w.webp 960w')
+
+    def test_animated_gif_keeps_first_frame(self):
+        output = BytesIO()
+        frames = [Image.new('P', (600, 300), color) for color in (1, 2)]
+        frames[0].save(
+            output, 'GIF', save_all=True, append_images=frames[1:]
+        )
+        post = self.create(SimpleUploadedFile('anim.gif', output.getvalue()))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertFalse(getattr(stored, 'is_animated', False))
+        self.assertEqual(post.image_widths, '480')
+
+    def test_narrow_image_gets_own_width(self):
+        """Узкая картинка получает копию своей ширины и не ждёт копий."""
+        post = self.create(image_file('narrow.jpg', (300, 200), 'JPEG'))
+        self.assertEqual(post.image_widths, '300')
+        name = images.rendition_name(post.image.name, 300)
+        self.assertTrue(images.storage().exists(name))
+        self.assertEqual(images.known_widths(post.image.name), '300')
+        images.delete(post.image.name)
+        self.assertFalse(images.storage().exists(name))
+        self.assertFalse(images.storage().exists(post.image.name))
+
+    def test_renditions_are_built_off_request(self):
+        """Запрос создания поста копии не строит, их строит задача."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Фото', 'image': image_file('x.jpg', (600, 300), 'JPEG'),
+        })
+        post = Post.objects.get(author=self.author)
+        self.assertEqual(post.image_widths, '')
+        name = images.rendition_name(post.image.name, 480)
+        self.assertFalse(images.storage().exists(name))
+        self.assertContains(
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            ),
+            'card-img',
+        )
+        jobs.clear()
+        images.schedule(post.image.name)
+        self.assertEqual(jobs.run_pending(), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.image_widths, '480')
+        self.assertTrue(images.storage().exists(name))
+
+    def test_ready_thumbnail_is_shown_without_renditions(self):
+        post = self.create(image_file('thumb.jpg', (1000, 500), 'JPEG'))
+        Post.objects.filter(pk=post.pk).update(image_widths='')
+        post.refresh_from_db()
+        thumbnails.prefetch([post])
+        self.assertEqual(post.thumbnail_url, '')
+        page = feed_cache.version((feed_cache.POST, post.pk))
+        thumbnails.render_thumbnails(post.image.name)
+        self.assertNotEqual(
+            feed_cache.version((feed_cache.POST, post.pk)), page
+        )
+        geometry, options = settings.POST_THUMBNAILS[0]
+        expected = get_thumbnail(
+            images.field_file(post.image.name), geometry, **options
+        ).url
+        del post.thumbnail_url
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch([post])
+        self.assertEqual(post.thumbnail_url, expected)
+        self.assertContains(
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            ),
+            expected,
+        )
+
+    def test_build_renditions_backfills(self):
+        post = self.create(image_file('old.jpg', (1000, 500), 'JPEG'))
+        Post.objects.filter(pk=post.pk).update(image_widths='')
+        out = StringIO()
+        call_command('build_renditions', stdout=out)
+        self.assertIn('Обработано 1 картинок, ошибок 0', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.image_widths, '480,960')
+
+
+class StoredImageTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='reposter')
+        self.client.force_login(self.author)
+
+    def create(self, text, upload):
+        self.client.post(
+            reverse('posts:post_create'), {'text': text, 'image': upload}
+        )
+        post = Post.objects.get(text=text)
+        images.render_post_image(post.image.name)
+        post.refresh_from_db()
+        return post
+
+    def test_identical_uploads_share_file(self):
+        first = self.create('Первый', image_file('a.jpg', (800, 400), 'JPEG'))
+        second = self.create(
+            'Второй', image_file('b.jpg', (800, 400), 'JPEG')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(second.image_widths, first.image_widths)
+        stored = StoredImage.objects.get(pk=first.image.name)
+        self.assertEqual(stored.refs, 2)
+        self.assertEqual(stored.size, first.image.size)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(
+            [name for name in os.listdir(directory) if name.endswith('.jpg')],
+            [os.path.basename(first.image.name)],
+        )
+
+    def test_unsaved_upload_remembers_name(self):
+        """Сохранённой картинкой считается только имя, а не файл."""
+        first = self.create('Первый', image_file('a.jpg', (800, 400), 'JPEG'))
+        upload = Post(
+            author=self.author, image=image_file('new.jpg', (10, 10), 'JPEG')
+        )
+        self.assertEqual(upload._saved_image, '')
+        copy = Post(author=self.author, image=first.image)
+        self.assertEqual(copy._saved_image, first.image.name)
+        copy.save()
+        self.assertEqual(
+            StoredImage.objects.get(pk=first.image.name).refs, 2
+        )
+
+    def test_file_removed_with_last_reference(self):
+        first = self.create('Первый', image_file('a.jpg', (800, 400), 'JPEG'))
+        second = self.create(
+            'Второй', image_file('b.jpg', (800, 400), 'JPEG')
+        )
+        name = first.image.name
+        rendition = images.rendition_name(name, 480)
+        first.delete()
+        # TestCase не выполняет on_commit, поэтому сборку зовём сами.
+        stored_images.collect(name)
+        self.assertTrue(images.storage().exists(name))
+        second.delete()
+        self.assertEqual(StoredImage.objects.get(pk=name).refs, 0)
+        stored_images.collect(name)
+        self.assertFalse(StoredImage.objects.filter(pk=name).exists())
+        self.assertFalse(images.storage().exists(name))
+        self.assertFalse(images.storage().exists(rendition))
+
+    def test_dedupe_media_merges_existing_files(self):
+        content = image_file('old.jpg', (800, 400), 'JPEG').read()
+        legacy = FileSystemStorage()
+        names = [
+            legacy.save(f'posts/legacy_{i}.jpg', ContentFile(content))
+            for i in range(2)
+        ]
+        for name in names:
+            Post.objects.create(author=self.author, text=name, image=name)
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('перенесено 1, слито с дубликатами 1', out.getvalue())
+        target = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(target), 1)
+        target = target.pop()
+        self.assertRegex(target, r'^posts/\w{2}/\w{64}\.jpg$')
+        for name in names:
+            self.assertFalse(legacy.exists(name))
+        self.assertTrue(legacy.exists(target))
+        self.assertEqual(StoredImage.objects.get(pk=target).refs, 2)
+        self.assertFalse(StoredImage.objects.exclude(pk=target).exists())
+        self.assertEqual(
+            set(Post.objects.values_list('image_widths', flat=True)),
+            {'480'},
+        )
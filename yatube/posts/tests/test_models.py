@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -86,3 +90,86 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(group._meta.get_field(
                     field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа',
+            slug='counter-group',
+            description='Описание',
+        )
+        self.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Описание',
+        )
+
+    def assert_counters(self, posts, comments, group_posts):
+        self.user.stats.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, posts)
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)),
+            comments,
+        )
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании, правке и удалении."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        self.assert_counters(posts=1, comments=1, group_posts=1)
+        post.group = self.other_group
+        post.save()
+        self.assert_counters(posts=1, comments=1, group_posts=0)
+        post.delete()
+        self.assert_counters(posts=0, comments=0, group_posts=0)
+
+    def test_stale_save_keeps_counter(self):
+        """save() устаревшего объекта не затирает счётчик."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        post.text = 'Правка'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики подписчиков."""
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        follow.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 0
+        )
+
+    def test_follow_is_unique(self):
+        """Вторая подписка на того же автора не записывается."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 1
+        )
+
+    def test_reconcile_counters(self):
+        """reconcile_counters пересчитывает разошедшиеся счётчики."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        UserStats.objects.update(posts_count=42)
+        Group.objects.update(posts_count=42)
+        Post.objects.update(comments_count=42)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assert_counters(posts=1, comments=1, group_posts=1)
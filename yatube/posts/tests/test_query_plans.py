@@ -0,0 +1,94 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryPlanMixin, explain, plan_problems
+
+from ..models import Comment, Follow, Group, Post, User
+from ..utils import encode_comment_cursor, encode_cursor
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTest(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'plan{i}') for i in range(4)
+        ]
+        cls.group = Group.objects.create(
+            title='Группа', slug='plans', description='Описание'
+        )
+        for i in range(settings.NUMBER_POSTS * 2):
+            cls.post = Post.objects.create(
+                author=cls.users[i % 4], text=f'Пост {i}', group=cls.group
+            )
+        for i in range(settings.NUMBER_COMMENTS * 2):
+            cls.comment = Comment.objects.create(
+                post=cls.post, author=cls.users[i % 4], text=f'Текст {i}'
+            )
+        for author in cls.users[1:]:
+            Follow.objects.create(user=cls.users[0], author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.users[0])
+
+    def test_feed_views_use_indexes(self):
+        """Ленты читаются по индексам, без полного прохода и сортировки."""
+        after = '?after=' + encode_cursor(
+            Post.objects.order_by('-pub_date', '-id')[5]
+        )
+        author = self.post.author.username
+        post_id = self.post.pk
+        # Поиск не проверяем: выдача сортируется по релевансу bm25, и
+        # такую сортировку индекс не заменит.
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + after,
+            reverse('posts:group_list', kwargs={'slug': 'plans'}),
+            reverse('posts:group_list', kwargs={'slug': 'plans'}) + after,
+            reverse('posts:profile', kwargs={'username': author}),
+            reverse('posts:profile', kwargs={'username': author}) + after,
+            reverse('posts:post_detail', kwargs={'post_id': post_id}),
+            reverse('posts:post_comments', kwargs={'post_id': post_id})
+            + '?after=' + encode_comment_cursor(
+                Comment.objects.order_by('created', 'id').first()
+            ),
+            reverse('posts:follow_index'),
+            reverse('posts:follow_index') + after,
+        )
+        for url in urls:
+            for client in (self.client, self.authorized_client):
+                with self.subTest(url=url, client=client):
+                    cache.clear()
+                    self.assertIndexedQueries(url, client)
+
+    def test_follow_lookup_uses_unique_index(self):
+        follows = Follow.objects.filter(
+            user=self.users[0], author=self.users[1]
+        )
+        sql, params = follows.query.sql_with_params()
+        plan = explain('default', sql, params)
+        self.assertEqual(plan_problems(plan), [])
+        self.assertIn('user_id=? AND author_id=?', ' '.join(plan))
+
+    def test_plan_problems_detects_scan_and_sort(self):
+        self.assertEqual(
+            plan_problems([
+                'SCAN posts_post',
+                'SCAN TABLE posts_post',
+                'USE TEMP B-TREE FOR ORDER BY',
+                'SCAN posts_post USING INDEX post_pub_date_id_idx',
+            ]),
+            [
+                'SCAN posts_post',
+                'SCAN TABLE posts_post',
+                'USE TEMP B-TREE FOR ORDER BY',
+            ],
+        )
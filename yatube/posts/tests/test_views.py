@@ -1,23 +1,44 @@
 
+import csv
+import gzip
+import json
+import os
 import shutil
 import tempfile
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (Client, LiveServerTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
 
+from core import auth
+from core.testing import QueryBudgetMixin
+
+from .. import cards, exporter, thumbnails, timeline, viewer
 from ..forms import PostForm
-from ..models import Follow, Group, Post, User
+from ..importer import MAX_ERRORS, PostImporter, import_rows, read_rows
+from ..management.commands.load_test import SKIPPED_ROUTES
+from ..models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                      TimelineEntry, User, UserStats)
+from ..urls import urlpatterns
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
         cls.small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
             b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -78,12 +99,13 @@ class PostViewsTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
+        cache.clear()
 
     def test_pages_uses_correct_template(self):
         """Проверка шаблонов."""
@@ -109,7 +131,7 @@ class PostViewsTests(TestCase):
         response = self.authorized_client.get(reverse('posts:index'))
         self.assert_post(response.context['page_obj'][0])
         img = Post.objects.first().image
-        self.assertEqual(img, 'posts/small.gif')
+        self.assertRegex(img.name, r'^posts/\w{2}/\w{64}\.gif$')
 
     def test_group_list_page_show_correct_context(self):
         """Проверка group_list с правильным ли context."""
@@ -122,7 +144,7 @@ class PostViewsTests(TestCase):
         self.assertEqual(response.context['group'], self.group)
         self.assert_post(response.context['page_obj'][0])
         img = Post.objects.first().image
-        self.assertEqual(img, 'posts/small.gif')
+        self.assertRegex(img.name, r'^posts/\w{2}/\w{64}\.gif$')
 
     def test_profile_page_show_correct_context(self):
         """Проверка profile с правильным ли context."""
@@ -135,7 +157,7 @@ class PostViewsTests(TestCase):
         self.assertEqual(response.context['author'], self.author)
         self.assert_post(response.context['page_obj'][0])
         img = Post.objects.first().image
-        self.assertEqual(img, 'posts/small.gif')
+        self.assertRegex(img.name, r'^posts/\w{2}/\w{64}\.gif$')
 
     def test_detail_page_show_correct_context(self):
         """Проверка post_detail с правильниым ли context."""
@@ -147,7 +169,7 @@ class PostViewsTests(TestCase):
         )
         self.assert_post(response.context['post'])
         img = Post.objects.first().image
-        self.assertEqual(img, 'posts/small.gif')
+        self.assertRegex(img.name, r'^posts/\w{2}/\w{64}\.gif$')
 
     def test_post_create_page_show_correct_context(self):
         """Шаблон post_create сформирован с правильным контекстом."""
@@ -173,15 +195,42 @@ class PostViewsTests(TestCase):
 
     def test_index_cache(self):
         """Тестирование кэша главной страницы."""
+        # Авторизованным лента рисуется заново из-за флагов посетителя,
+        # кэш страницы целиком — у гостей.
+        first = self.client.get(reverse('posts:index'))
+        # update() минует сигналы, поэтому версия кэша не меняется.
+        Post.objects.filter(pk=self.post.pk).update(text='Измененный текст')
+        second = self.client.get(reverse('posts:index'))
+        self.assertEqual(first.content, second.content)
+        cache.clear()
+        third = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(first.content, third.content)
+
+    def test_index_cache_invalidated_on_save(self):
+        """Сохранение поста сразу сбрасывает кэш ленты."""
         first = self.authorized_client.get(reverse('posts:index'))
         post = Post.objects.get()
         post.text = 'Измененный текст'
         post.save()
         second = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(first.content, second.content)
-        cache.clear()
-        third = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(first.content, third.content)
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, 'Измененный текст')
+
+    def test_group_cache_invalidated_on_group_change(self):
+        """Перенос поста в другую группу сбрасывает кэш обеих групп."""
+        old_url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        new_url = reverse(
+            'posts:group_list', kwargs={'slug': self.group_for_test.slug}
+        )
+        self.authorized_client.get(old_url)
+        self.authorized_client.get(new_url)
+        post = Post.objects.get()
+        post.group = self.group_for_test
+        post.save()
+        self.assertNotContains(self.authorized_client.get(old_url), post.text)
+        self.assertContains(self.authorized_client.get(new_url), post.text)
+        post.group = self.group
+        post.save()
 
 
 class NewPostViewsTest(TestCase):
@@ -267,6 +316,7 @@ class PaginatorViewsTest(TestCase):
 
     def setUp(self):
         self.guest_client = Client()
+        cache.clear()
 
     def test_paginator_on_pages(self):
         """Проверка пагинации на страницах."""
@@ -286,6 +336,40 @@ class PaginatorViewsTest(TestCase):
                     self.posts_on_second_page
                 )
 
+    def test_cursor_paginator_on_pages(self):
+        """Keyset-пагинация по токенам ?after= и ?before=."""
+        url = reverse('posts:index')
+        first_page = self.guest_client.get(url).context['page_obj']
+        self.assertEqual(len(first_page), self.posts_on_first_page)
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        second_page = self.guest_client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), self.posts_on_second_page)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        back_page = self.guest_client.get(
+            url, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_cursor_paginator_skips_count(self):
+        """Keyset-страница не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(reverse('posts:index'))
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_cursor_paginator_bad_token(self):
+        """Битый токен курсора открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': 'not-a-cursor'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), self.posts_on_first_page
+        )
+
 
 class FollowTest(TestCase):
     def setUp(self):
@@ -324,6 +408,86 @@ class FollowTest(TestCase):
         )
         self.assertEqual(Follow.objects.all().count(), 0)
 
+    def test_follow_is_idempotent(self):
+        url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.following_user.username},
+        )
+        for _ in range(2):
+            self.follower.get(url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.following_user).followers_count,
+            1,
+        )
+        self.follower_user.refresh_from_db()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower_user).count(), 1
+        )
+
+    def test_follow_self_is_ignored(self):
+        self.follower.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.follower_user.username},
+        ))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_unknown_user_is_404(self):
+        for name in ('profile_follow', 'profile_unfollow'):
+            with self.subTest(name=name):
+                response = self.follower.get(reverse(
+                    f'posts:{name}', kwargs={'username': 'nobody'}
+                ))
+                self.assertEqual(response.status_code, 404)
+
+    def test_follow_json(self):
+        """AJAX-запрос получает JSON с числом подписчиков."""
+        kwargs = {'username': self.following_user.username}
+        response = self.follower.get(
+            reverse('posts:profile_follow', kwargs=kwargs),
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'username': 'following',
+            'following': True,
+            'followers_count': 1,
+        })
+        response = self.follower.get(
+            reverse('posts:profile_unfollow', kwargs=kwargs),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.json()['followers_count'], 0)
+        self.assertFalse(response.json()['following'])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_follow_bulk(self):
+        User.objects.create(username='third')
+        url = reverse('posts:follow_bulk')
+        response = self.follower.post(
+            url,
+            json.dumps({'usernames': [
+                'following', 'third', 'nobody', 'follower', 'third'
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'requested': 4,
+            'followed': 2,
+            'following_count': 2,
+        })
+        response = self.follower.post(url, {'username': ['following']})
+        self.assertEqual(response.json()['followed'], 0)
+        self.assertEqual(
+            Follow.objects.filter(user=self.follower_user).count(), 2
+        )
+        self.assertEqual(
+            self.follower.post(
+                url, '{"usernames": "x"}', content_type='application/json'
+            ).status_code,
+            400,
+        )
+        self.assertEqual(self.follower.get(url).status_code, 405)
+
     def test_sub_news_feed(self):
         Follow.objects.create(
             user=self.follower_user,
@@ -356,3 +520,842 @@ class FollowTest(TestCase):
             self.following.get(f'/posts/{self.post.pk}/'),
             'Комментарий клиента',
         )
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create(username='reader')
+        self.author = User.objects.create(username='author')
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        return list(self.client.get(
+            reverse('posts:follow_index')
+        ).context['page_obj'])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков при сохранении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post])
+
+    def test_follow_backfills_and_unfollow_purges(self):
+        """Подписка достраивает ленту, отписка её чистит."""
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        ))
+        self.assertEqual(self.feed(), [post])
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_large_author_is_merged_on_read(self):
+        """Посты популярных авторов подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_below_limit_is_refilled(self):
+        """Вернувшийся под порог автор раскладывается по лентам заново."""
+        other = User.objects.create(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.client.force_login(other)
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.client.force_login(self.reader)
+        timeline.refill(self.author.pk)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post])
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines пересобирает ленты с нуля."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [post])
+
+
+@override_settings(NUMBER_POSTS=2)
+class SearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='searcher')
+        self.post = Post.objects.create(
+            author=self.author, text='Пишу про <b>котиков</b> и собак',
+        )
+        self.other = Post.objects.create(
+            author=self.author, text='Сегодня только про собак',
+        )
+        self.comment = Comment.objects.create(
+            post=self.other, author=self.author, text='А где котики?',
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('posts:search'), params)
+
+    def test_search_finds_posts_and_comments(self):
+        """Поиск находит посты и комментарии, подсвечивая слова."""
+        response = self.search(q='котиков')
+        hits = list(response.context['page_obj'])
+        self.assertEqual([hit.post for hit in hits], [self.post])
+        self.assertIn('<mark>котиков</mark>', hits[0].snippet)
+        self.assertNotIn('<b>', hits[0].snippet)
+        hits = list(self.search(q='котики').context['page_obj'])
+        self.assertEqual([hit.post for hit in hits], [self.other])
+        self.assertTrue(hits[0].is_comment)
+
+    def test_search_keyset_pages(self):
+        """Результаты поиска листаются по курсору."""
+        Post.objects.create(author=self.author, text='И снова собак')
+        first = self.search(q='собак').context['page_obj']
+        self.assertEqual(len(first), 2)
+        self.assertTrue(first.has_next())
+        second = self.search(
+            q='собак', after=first.next_cursor
+        ).context['page_obj']
+        self.assertEqual(len(second), 1)
+        self.assertFalse(second.has_next())
+        seen = {hit.post.pk for hit in list(first) + list(second)}
+        self.assertEqual(len(seen), 3)
+
+    def test_search_shows_post_once(self):
+        """Пост и его комментарий с теми же словами — один результат."""
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Снова про собак',
+        )
+        Post.objects.create(author=self.author, text='И снова собак')
+        first = self.search(q='собак').context['page_obj']
+        second = self.search(
+            q='собак', after=first.next_cursor
+        ).context['page_obj']
+        self.assertEqual(len(first), 2)
+        posts = [hit.post.pk for hit in list(first) + list(second)]
+        self.assertEqual(len(posts), 3)
+        self.assertEqual(len(set(posts)), 3)
+        self.assertFalse(second.has_next())
+
+    def test_search_index_follows_deletes(self):
+        """Удалённые посты пропадают из индекса."""
+        self.post.delete()
+        self.assertEqual(len(self.search(q='котиков').context['page_obj']), 0)
+
+    def test_search_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        response = self.search(q='"котиков AND OR (')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_search_index_command(self):
+        """rebuild_search_index восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search(q='собак').context['page_obj']), 2)
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='page_cache', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Кэшируемый пост', group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_guest_gets_not_modified(self):
+        """Повторный запрос с ETag получает 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_guest_page_is_served_from_cache(self):
+        """Ответ берётся из кэша, пока не изменятся посты."""
+        url = reverse('posts:index')
+        first = self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Изменён')
+        second = self.client.get(url)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_changes_expire_pages(self):
+        """Правки постов, комментарии и подписки меняют ETag."""
+        changes = (
+            (self.urls[0], lambda: Post.objects.create(
+                author=self.author, text='Новый пост')),
+            (self.urls[1], lambda: self.group.save()),
+            (self.urls[2], lambda: Follow.objects.create(
+                user=self.reader, author=self.author)),
+            (self.urls[3], lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_rename_expires_comments(self):
+        """Новое имя комментатора видно на странице чужого поста."""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        url = self.urls[3]
+        self.assertContains(self.client.get(url), '/profile/reader/')
+        self.reader.username = 'renamed'
+        self.reader.save()
+        response = self.client.get(url)
+        self.assertContains(response, '/profile/renamed/')
+        self.assertNotContains(response, '/profile/reader/')
+
+    def test_query_string_is_part_of_key(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.client.get(url + '?page=2')['ETag'],
+        )
+
+    def test_authorized_pages_are_not_cached(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn('ETag', response)
+        self.assertIsNotNone(response.context)
+
+    def test_unknown_objects_are_404(self):
+        for url in (
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+            reverse('posts:profile', kwargs={'username': 'missing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 0}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{i}') for i in range(5)
+        ]
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание'
+        )
+        for i in range(settings.NUMBER_POSTS + 5):
+            # Картинки: с копиями, без копий и без картинки — без копий
+            # шаблон проверяет готовность миниатюры sorl.
+            image = f'posts/{i:02}/{i:064}.jpg' if i % 3 else ''
+            cls.post = Post.objects.create(
+                author=cls.users[i % 5], text=f'Пост {i}', group=cls.group,
+                image=image, image_widths='480' if i % 3 == 1 else '',
+            )
+        geometry, options = settings.POST_THUMBNAILS[0]
+        KVStore.objects.create(
+            key=add_prefix(thumbnails.thumbnail_file(
+                cls.post.image.name, geometry, options
+            ).key),
+            value='{}',
+        )
+        for user in cls.users:
+            Comment.objects.create(post=cls.post, author=user, text='Текст')
+        for author in cls.users[1:]:
+            Follow.objects.create(user=cls.users[0], author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.users[0])
+
+    def test_views_stay_within_query_budget(self):
+        """Число запросов вью не растёт с числом постов на странице."""
+        author = self.post.author.username
+        urls = {
+            reverse('posts:index'): False,
+            reverse('posts:group_list', kwargs={'slug': 'budget'}): False,
+            reverse('posts:profile', kwargs={'username': author}): False,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}):
+                False,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}):
+                False,
+            reverse('posts:search') + '?q=Пост': False,
+            reverse('posts:follow_index'): True,
+            reverse('posts:post_create'): True,
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}):
+                True,
+        }
+        for url, login_only in urls.items():
+            clients = [self.authorized_client]
+            if not login_only:
+                clients.append(self.client)
+            for client in clients:
+                with self.subTest(url=url, client=client):
+                    cache.clear()
+                    self.assertWithinQueryBudget(url, client)
+
+
+class DatasetTest(LiveServerTestCase):
+    def setUp(self):
+        # seed_dataset создаёт пользователей bulk_create, а после
+        # очистки базы их id совпадут с id пользователей прошлых тестов,
+        # которые ещё лежат в кэше процесса со старым хэшем пароля.
+        auth.clear()
+        self.directory = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def seed(self, images=2):
+        call_command(
+            'seed_dataset',
+            users=20,
+            groups=3,
+            posts=200,
+            comments_per_post=1,
+            follows_per_user=5,
+            images=images,
+            chunk_size=50,
+            stdout=StringIO(),
+        )
+
+    def test_seed_dataset(self):
+        """Набор данных создан, а производные данные пересобраны."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 100)
+        self.assertGreater(Post.objects.exclude(image='').count(), 0)
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'day').count(), 1
+        )
+        author = User.objects.order_by('pk').first()
+        self.assertEqual(author.stats.posts_count, author.posts.count())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=follow.user_id, author=follow.author_id
+            ).count(),
+            Post.objects.filter(author=follow.author_id).count(),
+        )
+
+    def test_load_test(self):
+        """Нагрузочный прогон пишет задержки по каждому адресу."""
+        # Без картинок: sorl пишет в thumbnail_kvstore, а база в памяти
+        # не выдерживает параллельных записей из потоков live-сервера.
+        self.seed(images=0)
+        path = os.path.join(self.directory, 'load.json')
+        call_command(
+            'load_test',
+            base_url=self.live_server_url,
+            requests=3,
+            concurrency=1,
+            json=path,
+            stdout=StringIO(),
+        )
+        with open(path) as report:
+            routes = json.load(report)['routes']
+        self.assertEqual(
+            len(routes), 2 * (len(urlpatterns) - len(SKIPPED_ROUTES))
+        )
+        self.assertNotIn('profile_follow [authenticated]', routes)
+        self.assertNotIn('follow_bulk [authenticated]', routes)
+        with self.assertRaises(CommandError):
+            call_command(
+                'load_test',
+                base_url=self.live_server_url,
+                routes='index,profile_unfollow',
+                json=path,
+                stdout=StringIO(),
+            )
+        index = routes['index [anonymous]']
+        self.assertEqual(index['statuses'], {'200': 3})
+        self.assertLessEqual(index['p50_ms'], index['p99_ms'])
+        self.assertEqual(
+            routes['follow_index [authenticated]']['statuses'], {'200': 3}
+        )
+
+
+@override_settings(NUMBER_COMMENTS=3)
+class CommentPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Обсуждение')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+            for i in range(5)
+        ]
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+        cls.more_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_batch(self):
+        """Страница поста показывает первую порцию, старые сначала."""
+        response = self.client.get(self.detail_url)
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:3])
+        self.assertTrue(page.has_next())
+        self.assertContains(response, f'{self.more_url}?after=')
+        self.assertNotContains(response, 'Комментарий 3')
+
+    def test_load_more_returns_next_batch(self):
+        """Фрагмент по курсору отдаёт следующую порцию без кнопки."""
+        first = self.client.get(self.detail_url).context['comments']
+        response = self.client.get(
+            self.more_url, {'after': first.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(list(response.context['comments']), self.comments[3:])
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_detail_accepts_cursor_without_js(self):
+        first = self.client.get(self.detail_url).context['comments']
+        response = self.client.get(
+            self.detail_url, {'after': first.next_cursor}
+        )
+        self.assertContains(response, 'Комментарий 4')
+        self.assertNotContains(response, 'Комментарий 0')
+
+    def test_unknown_post_is_404(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='imported', description='Описание'
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def run_import(self, path, kind, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_content', path, kind=kind, stdout=out, stderr=err,
+            **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_posts_comments_and_follows(self):
+        """Импорт сохраняет даты, связи и пересчитывает счётчики."""
+        rows = (
+            {'id': 100, 'author': 'author', 'text': 'Старый пост',
+             'pub_date': '2015-03-01T10:00:00+00:00', 'group': 'imported'},
+            {'author': 'author', 'text': 'Без группы',
+             'pub_date': '2016-01-01T00:00:00'},
+            {'author': 'nobody', 'text': 'Неизвестный автор'},
+        )
+        posts = self.write(
+            'posts.ndjson',
+            ''.join(json.dumps(row) + '\n' for row in rows) + 'не json\n',
+        )
+        out, err = self.run_import(posts, 'posts', chunk_size=2)
+        self.assertIn('Создано 2, пропущено 2', out)
+        self.assertIn("Строка 3: автор 'nobody': нет в базе", err)
+        self.assertIn('Строка 4: некорректный JSON', err)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.posts_count, 2
+        )
+
+        comments = self.write(
+            'comments.csv',
+            'post,author,text,created\n'
+            '100,reader,Комментарий,2015-03-02T10:00:00+00:00\n'
+            '999,reader,К несуществующему посту,\n',
+        )
+        out, _ = self.run_import(comments, 'comments')
+        self.assertIn('Создано 1, пропущено 1', out)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.created.year, 2015)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        follows = self.write(
+            'follows.ndjson',
+            '{"user": "reader", "author": "author"}\n'
+            '{"user": "reader", "author": "author"}\n'
+            '{"user": "reader", "author": "reader"}\n',
+        )
+        out, _ = self.run_import(follows, 'follows')
+        self.assertIn('Создано 1, пропущено 2', out)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_imported_posts_are_searchable(self):
+        """Индекс и ленты обновляются только для записей импорта."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        path = self.write('posts.ndjson', json.dumps(
+            {'author': 'author', 'text': 'Импортированный бегемот'}
+        ) + '\n')
+        self.run_import(path, 'posts')
+        post = Post.objects.get()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post
+        ).exists())
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:search'), {'q': 'бегемот'})
+        self.assertEqual(
+            [hit.post for hit in response.context['page_obj']], [post]
+        )
+
+    def test_errors_are_bounded(self):
+        """Ошибки считаются все, а хранятся только первые."""
+        long_field = 'x' * (csv.field_size_limit() + 1)
+        path = self.write('posts.csv', 'author,text\n' + ''.join(
+            f'nobody,Пост {i}\n' for i in range(MAX_ERRORS + 5)
+        ) + f'author,"{long_field}"\nauthor,Целый пост\n')
+        rows = read_rows(path, 'csv')
+        result = import_rows(
+            rows, PostImporter(), 'bounded', chunk_size=50
+        )
+        self.assertEqual(result.error_count, MAX_ERRORS + 6)
+        self.assertEqual(len(result.errors), MAX_ERRORS)
+        self.assertEqual(result.created, 1)
+        _, err = self.run_import(path, 'posts')
+        self.assertIn(f'... и ещё {MAX_ERRORS + 6 - 20} ошибок', err)
+
+    def test_import_resumes_from_checkpoint(self):
+        """Повторный запуск продолжает с первой незаписанной строки."""
+        path = self.write('posts.ndjson', ''.join(
+            json.dumps({'author': 'author', 'text': f'Пост {i}'}) + '\n'
+            for i in range(5)
+        ))
+        self.run_import(path, 'posts', chunk_size=2)
+        self.assertEqual(Post.objects.count(), 5)
+        out, _ = self.run_import(path, 'posts')
+        self.assertIn('Создано 0, пропущено 0 из 0 строк', out)
+        self.assertEqual(Post.objects.count(), 5)
+
+        ImportCheckpoint.objects.update(rows=3)
+        Post.objects.filter(text__in=('Пост 3', 'Пост 4')).delete()
+        out, _ = self.run_import(path, 'posts')
+        self.assertIn('Продолжено со строки 4', out)
+        self.assertEqual(Post.objects.count(), 5)
+
+        self.run_import(path, 'posts', restart=True)
+        self.assertEqual(Post.objects.count(), 10)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='export', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост, "{i}"', group=cls.group
+            )
+            for i in range(3)
+        ]
+        Post.objects.create(author=cls.other, text='Чужой пост')
+
+    def setUp(self):
+        self.client.force_login(self.other)
+
+    def download(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_group_ndjson(self):
+        response, content = self.download(
+            reverse('posts:export_group', kwargs={'slug': 'export'})
+        )
+        self.assertIn(
+            'posts-group-export.ndjson', response['Content-Disposition']
+        )
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [
+            post.pk for post in self.posts
+        ])
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['group'], 'export')
+        self.assertEqual(rows[0]['text'], 'Пост, "0"')
+
+    def test_profile_csv_gzip(self):
+        response, content = self.download(
+            reverse('posts:export_profile', kwargs={'username': 'other'}),
+            format='csv',
+            compress='gzip',
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(exporter.FIELDS))
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Чужой пост', lines[1])
+
+    def test_bad_format_and_access(self):
+        url = reverse('posts:export_group', kwargs={'slug': 'export'})
+        self.assertEqual(
+            self.client.get(url, {'format': 'xml'}).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get(reverse('posts:export_all')).status_code, 302
+        )
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_export_command_round_trips(self):
+        """Выгрузку понимает import_content."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'posts.csv')
+        call_command(
+            'export_content', group='export', format='csv', output=path,
+            stderr=StringIO(),
+        )
+        Post.objects.filter(group=self.group).delete()
+        call_command(
+            'import_content', path, kind='posts', stdout=StringIO(),
+        )
+        self.assertEqual(
+            sorted(Post.objects.filter(group=self.group).values_list(
+                'pk', 'text', 'pub_date'
+            )),
+            sorted((post.pk, post.text, post.pub_date) for post in self.posts),
+        )
+
+
+class PostCardTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='carder')
+        cls.reader = User.objects.create_user(username='card_reader')
+        cls.group = Group.objects.create(
+            title='Карточки', slug='cards', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост в карточке', group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def load(self):
+        return Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+
+    def test_feeds_read_stored_cards(self):
+        """Ленты берут карточку из кэша, а не отрисовывают заново."""
+        post = self.load()
+        cache.set(cards.card_key(post), '<p>готовая карточка</p>')
+        cache.set(
+            cards.card_key(post, group_link=False), '<p>карточка группы</p>'
+        )
+        self.client.force_login(self.reader)
+        for url, marker in (
+            (reverse('posts:index'), 'готовая карточка'),
+            (reverse('posts:follow_index'), 'готовая карточка'),
+            (reverse('posts:profile', args=['carder']), 'готовая карточка'),
+            (reverse('posts:group_list', args=['cards']), 'карточка группы'),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), marker)
+
+    def test_group_link_variant(self):
+        post = self.load()
+        link = reverse('posts:group_list', args=['cards'])
+        feed_card, group_card = (
+            cards.cards([post])[0],
+            cards.cards([post], group_link=False)[0],
+        )
+        self.assertIn(link, feed_card)
+        self.assertNotIn(link, group_card)
+        self.assertIn('Пост в карточке', group_card)
+
+    def test_changes_give_new_version(self):
+        """Правка поста, группы и имени автора меняют ключ карточки."""
+        key = cards.card_key(self.load())
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        edited = cards.card_key(self.load())
+        self.assertNotEqual(key, edited)
+        self.post.group = None
+        self.post.save()
+        ungrouped = cards.card_key(self.load())
+        self.assertNotEqual(edited, ungrouped)
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        post = self.load()
+        self.assertNotEqual(ungrouped, cards.card_key(post))
+        self.assertIn('Новое имя', cards.cards([post])[0])
+
+    def test_ready_thumbnail_gives_new_version(self):
+        """Готовая миниатюра меняет ключ карточки поста без копий."""
+        name = f'posts/00/{0:064}.jpg'
+        Post.objects.filter(pk=self.post.pk).update(image=name)
+        key = cards.card_key(self.load())
+        geometry, options = settings.POST_THUMBNAILS[0]
+        thumbnail = thumbnails.thumbnail_file(name, geometry, options)
+        KVStore.objects.create(key=add_prefix(thumbnail.key), value='{}')
+        cache.clear()
+        post = self.load()
+        self.assertNotEqual(key, cards.card_key(post))
+        self.assertIn(thumbnail.url, cards.cards([post])[0])
+
+    def test_warm_stores_both_variants(self):
+        post = self.load()
+        self.assertEqual(cards.warm([post]), 1)
+        self.assertIsNotNone(cache.get(cards.card_key(post)))
+        self.assertIsNotNone(
+            cache.get(cards.card_key(post, group_link=False))
+        )
+
+    def test_template_benchmark(self):
+        out = StringIO()
+        call_command('template_benchmark', sizes='2', repeat=1, stdout=out)
+        for profile in ('dev', 'cached-loader', 'cached-cards'):
+            self.assertIn(f'{profile}: 2 постов', out.getvalue())
+
+
+class ViewerFlagsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='flag_reader')
+        cls.authors = [
+            User.objects.create_user(username=f'flag_author{i}')
+            for i in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(author=author, text=f'Пост {author}')
+            for author in cls.authors + [cls.reader]
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.reader, text='Комментарий'
+        )
+        Comment.objects.create(
+            post=cls.posts[1], author=cls.reader, text='Ещё один'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def flags(self, post):
+        return (
+            post.viewer_follows, post.viewer_is_author, post.viewer_commented
+        )
+
+    def test_annotate_page_in_two_queries(self):
+        posts = Post.objects.select_related('author')
+        with self.assertNumQueries(3):
+            annotated = {
+                post.pk: self.flags(post)
+                for post in viewer.annotate(posts, self.reader)
+            }
+        self.assertEqual(annotated, {
+            self.posts[0].pk: (True, False, False),
+            self.posts[1].pk: (False, False, True),
+            self.posts[2].pk: (False, False, False),
+            self.posts[3].pk: (False, True, False),
+        })
+
+    def test_anonymous_needs_no_queries(self):
+        from django.contrib.auth.models import AnonymousUser
+        with self.assertNumQueries(0):
+            posts = viewer.annotate(self.posts, AnonymousUser())
+        self.assertFalse(any(any(self.flags(post)) for post in posts))
+
+    def test_feeds_and_post_show_flags(self):
+        self.client.force_login(self.reader)
+        for url, marker in (
+            (reverse('posts:index'), 'Вы подписаны на автора'),
+            (reverse('posts:index'), 'Вы комментировали'),
+            (reverse('posts:index'), 'Ваш пост'),
+            (reverse('posts:follow_index'), 'Вы подписаны на автора'),
+            (
+                reverse('posts:profile', args=['flag_author1']),
+                'Вы комментировали',
+            ),
+            (
+                reverse('posts:post_detail', args=[self.posts[0].pk]),
+                'Вы подписаны на автора',
+            ),
+            (
+                reverse('posts:post_detail', args=[self.posts[3].pk]),
+                'Редактировать',
+            ),
+        ):
+            with self.subTest(url=url, marker=marker):
+                self.assertContains(self.client.get(url), marker)
+
+    def test_flags_are_not_shared_between_viewers(self):
+        """Другой посетитель не видит чужие флаги из кэша фрагментов."""
+        self.client.force_login(self.reader)
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.authors[2])
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Вы подписаны на автора')
+        self.assertNotContains(response, 'Вы комментировали')
@@ -0,0 +1,211 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+чтение ``follow_index`` — это один диапазонный проход по индексу
+``(user, -pub_date, -post)``. Посты авторов, у которых подписчиков
+больше ``settings.TIMELINE_FANOUT_LIMIT``, не раскладываются, а
+подмешиваются к ленте при чтении.
+
+Когда после отписок автор возвращается под порог, подмешивание его
+постов прекращается, поэтому задача очереди ``refill`` раскладывает
+все его посты по лентам подписчиков.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from core import jobs
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import CursorPaginator, keyset_slice
+
+TIMELINE_KEYS = ('pub_date', 'post_id')
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+
+
+def is_fanout_author(author_id):
+    """Раскладываются ли посты автора по лентам при записи."""
+    followers = UserStats.objects.filter(
+        user_id=author_id,
+    ).values_list('followers_count', flat=True).first()
+    return (followers or 0) <= fanout_limit()
+
+
+def merged_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются на лету."""
+    return UserStats.objects.filter(
+        user__following__user=user,
+        followers_count__gt=fanout_limit(),
+    ).values_list('user', flat=True)
+
+
+def entries_for(post, user_ids):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post=post,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+    ]
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_fanout_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id,
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        entries_for(post, followers),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def _insert_rows(rows, on_conflict=''):
+    """Вставляет строки ленты из ``values_list`` одним INSERT ... SELECT.
+
+    Построчная вставка на больших графах подписок создаёт миллионы
+    объектов в Python.
+    """
+    select, params = rows.order_by().distinct().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) {select} {on_conflict}',
+            params,
+        )
+
+
+def _insert_entries(follows, on_conflict=''):
+    """Раскладывает посты авторов из ``follows``."""
+    _insert_rows(
+        follows.filter(
+            author__stats__followers_count__lte=fanout_limit(),
+            author__posts__isnull=False,
+        ).values_list(
+            'user_id', 'author__posts__id', 'author_id',
+            'author__posts__pub_date',
+        ),
+        on_conflict,
+    )
+
+
+def fan_out_many(post_ids):
+    """То же, что ``fan_out``, для многих постов одним запросом."""
+    _insert_rows(
+        Follow.objects.filter(
+            author__posts__in=post_ids,
+            author__stats__followers_count__lte=fanout_limit(),
+        ).values_list(
+            'user_id', 'author__posts__id', 'author_id',
+            'author__posts__pub_date',
+        ),
+        'ON CONFLICT DO NOTHING',
+    )
+
+
+def backfill(user, *authors):
+    """Добавляет в ленту пользователя посты авторов после подписки."""
+    _insert_entries(
+        Follow.objects.filter(user=user, author__in=authors),
+        on_conflict='ON CONFLICT DO NOTHING',
+    )
+
+
+def backfill_follows(follow_ids):
+    """То же, что ``backfill``, для подписок ``follow_ids``."""
+    _insert_entries(
+        Follow.objects.filter(pk__in=follow_ids),
+        on_conflict='ON CONFLICT DO NOTHING',
+    )
+
+
+def refill(author_id):
+    """Задача очереди: раскладывает все посты автора по лентам.
+
+    Ставится, когда автор опустился до порога: посты, опубликованные
+    выше порога, до этого подмешивались при чтении.
+    """
+    if is_fanout_author(author_id):
+        _insert_entries(
+            Follow.objects.filter(author_id=author_id),
+            on_conflict='ON CONFLICT DO NOTHING',
+        )
+
+
+def followers_dropped(*author_ids):
+    """Ставит ``refill`` авторам, опустившимся до порога после отписки.
+
+    Вызывается после уменьшения ``followers_count``: при отписке счётчик
+    меняется на единицу, так что порог пересекли ровно те, у кого
+    подписчиков теперь столько же, сколько порог.
+    """
+    crossed = UserStats.objects.filter(
+        user_id__in=author_ids, followers_count=fanout_limit(),
+    ).values_list('user_id', flat=True)
+    for author_id in crossed:
+        transaction.on_commit(
+            lambda author_id=author_id: jobs.defer(refill, author_id)
+        )
+
+
+def purge(user, *authors):
+    """Убирает посты авторов из ленты пользователя после отписки."""
+    TimelineEntry.objects.filter(user=user, author__in=authors).delete()
+
+
+@transaction.atomic
+def rebuild(users=None):
+    """Пересобирает ленты с нуля, возвращает число записей."""
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if users is not None:
+        entries = entries.filter(user__in=users)
+        follows = follows.filter(user__in=users)
+    entries.delete()
+    _insert_entries(follows)
+    return entries.count()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Keyset-пагинатор по материализованной ленте пользователя.
+
+    ``object_list`` — посты авторов, которые читаются на лету; они
+    сливаются со страницей из ``TimelineEntry`` по тому же курсору.
+    """
+
+    def __init__(self, user, per_page):
+        self.user = user
+        super().__init__(
+            Post.objects.select_related('author', 'group').filter(
+                author__in=list(merged_authors(user)),
+            ),
+            per_page,
+        )
+
+    def fetch(self, limit, after=None, before=None):
+        entries = TimelineEntry.objects.filter(
+            user=self.user,
+        ).select_related('post__author', 'post__group')
+        posts = {
+            entry.post.pk: entry.post
+            for entry in keyset_slice(
+                entries, limit, after, before, keys=TIMELINE_KEYS
+            )
+        }
+        for post in keyset_slice(self.object_list, limit, after, before):
+            posts.setdefault(post.pk, post)
+        merged = sorted(
+            posts.values(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=True,
+        )
+        if before is not None:
+            return merged[-limit:]
+        return merged[:limit]
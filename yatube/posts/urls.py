@@ -8,9 +8,16 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_list, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
+    path('search/', views.search, name='search'),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
@@ -26,5 +33,16 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        'group/<slug:slug>/export/',
+        views.export_group,
+        name='export_group'
+    ),
+    path(
+        'profile/<str:username>/export/',
+        views.export_profile,
+        name='export_profile'
+    ),
+    path('export/', views.export_all, name='export_all'),
     path('', views.index, name='index'),
 ]
@@ -1,9 +1,199 @@
-from django.core.paginator import Paginator
 from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+KEYSET_KEYS = ('pub_date', 'id')
+KEYSET_ORDERING = ('-pub_date', '-id')
 
-def paginator(request, posts):
-    paginator = Paginator(posts, settings.NUMBER_POSTS)
+
+def make_cursor(date, pk):
+    return urlsafe_base64_encode(f'{date.isoformat()}|{pk}'.encode())
+
+
+def encode_cursor(post):
+    """Непрозрачный токен позиции поста в ленте: (pub_date, id)."""
+    return make_cursor(post.pub_date, post.pk)
+
+
+def encode_comment_cursor(comment):
+    """Токен позиции комментария в обсуждении: (created, id)."""
+    return make_cursor(comment.created, comment.pk)
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для битого токена возвращает None."""
+    try:
+        pub_date, pk = urlsafe_base64_decode(token).decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации.
+
+    Совместима с контрактом ``page_obj`` шаблона
+    ``posts/includes/paginator.html``, но не знает ни номера страницы,
+    ни общего числа страниц, поэтому ни одного ``COUNT(*)`` не делает.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, 1, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.encode(self.object_list[-1])
+        return ''
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.encode(self.object_list[0])
+        return ''
+
+    @property
+    def cursor(self):
+        """Ключ текущей страницы, годится для кэширования фрагментов."""
+        if self.object_list:
+            return self.paginator.encode(self.object_list[0])
+        return ''
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+def keyset_slice(queryset, limit, after=None, before=None,
+                 keys=KEYSET_KEYS, descending=True):
+    """До ``limit`` строк ленты рядом с курсором.
+
+    ``keys`` — имена полей с датой и идентификатором, по которым
+    упорядочена лента (по умолчанию от новых к старым, при
+    ``descending=False`` — от старых к новым); курсоры — результат
+    ``decode_cursor``.
+    """
+    date_key, id_key = keys
+    sign, forward, backward = ('-', 'lt', 'gt') if descending else (
+        '', 'gt', 'lt'
+    )
+    queryset = queryset.order_by(f'{sign}{date_key}', f'{sign}{id_key}')
+    if after is not None:
+        pub_date, pk = after
+        return list(queryset.filter(
+            Q(**{f'{date_key}__{forward}': pub_date})
+            | Q(**{date_key: pub_date, f'{id_key}__{forward}': pk})
+        )[:limit])
+    if before is not None:
+        pub_date, pk = before
+        rows = list(queryset.filter(
+            Q(**{f'{date_key}__{backward}': pub_date})
+            | Q(**{date_key: pub_date, f'{id_key}__{backward}': pk})
+        ).reverse()[:limit])
+        return rows[::-1]
+    return list(queryset[:limit])
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) вместо OFFSET.
+
+    Стоимость выборки страницы не зависит от глубины: в запрос уходит
+    условие по индексируемым полям и LIMIT на одну запись больше
+    размера страницы, чтобы узнать, есть ли следующая.
+    """
+
+    encode = staticmethod(encode_cursor)
+    decode = staticmethod(decode_cursor)
+    ordering = KEYSET_ORDERING
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    def fetch(self, limit, after=None, before=None):
+        return keyset_slice(self.object_list, limit, after, before)
+
+    def get_page(self, after=None, before=None):
+        after = self.decode(after) if after else None
+        before = self.decode(before) if before else None
+        limit = self.per_page + 1
+        if after is not None:
+            rows = self.fetch(limit, after=after)
+            return CursorPage(
+                rows[:self.per_page], self,
+                has_next=len(rows) > self.per_page,
+                has_previous=True,
+            )
+        if before is not None:
+            rows = self.fetch(limit, before=before)
+            return CursorPage(
+                rows[-self.per_page:], self,
+                has_next=True,
+                has_previous=len(rows) > self.per_page,
+            )
+        rows = self.fetch(limit)
+        return CursorPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page,
+            has_previous=False,
+        )
+
+
+class CommentPaginator(CursorPaginator):
+    """Keyset-пагинатор обсуждения: от старых комментариев к новым.
+
+    Ключ ``(created, id)`` покрывается индексом ``(post, created)``,
+    поэтому следующая порция обсуждения любой длины — один проход по
+    индексу.
+    """
+
+    encode = staticmethod(encode_comment_cursor)
+    ordering = ('created', 'id')
+
+    def fetch(self, limit, after=None, before=None):
+        return keyset_slice(
+            self.object_list, limit, after, before,
+            keys=('created', 'id'), descending=False,
+        )
+
+
+def cursor_page(request, cursor_paginator):
+    return cursor_paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def paginator(request, posts, count=None):
+    """Страница ленты постов.
+
+    По умолчанию работает keyset-пагинация с токенами ``?after=`` и
+    ``?before=``; старые ссылки вида ``?page=N`` обслуживаются обычным
+    ``Paginator``. Если число постов уже известно из хранимого
+    счётчика, его можно передать в ``count`` вместо ``COUNT(*)``.
+    """
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        offset_paginator = Paginator(posts, settings.NUMBER_POSTS)
+        if count is not None:
+            offset_paginator.count = count
+        return offset_paginator.get_page(page_number)
+    return cursor_page(
+        request, CursorPaginator(posts, settings.NUMBER_POSTS)
+    )
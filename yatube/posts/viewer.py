@@ -0,0 +1,63 @@
+"""Отношения посетителя к постам страницы.
+
+``annotate`` проставляет каждому посту страницы флаги для текущего
+посетителя:
+
+* ``viewer_is_author`` — пост посетителя (без запроса к базе);
+* ``viewer_follows`` — посетитель подписан на автора поста;
+* ``viewer_commented`` — посетитель комментировал пост.
+
+Флаги подписки и комментариев считаются одним запросом каждый на всю
+страницу, а не запросом на пост. Гостю все флаги — ``False`` без
+запросов.
+"""
+from .models import Comment, Follow
+
+
+def following_ids(user, author_ids):
+    """Id авторов из ``author_ids``, на которых подписан ``user``."""
+    author_ids = set(author_ids) - {user.pk}
+    if not user.is_authenticated or not author_ids:
+        return set()
+    return set(
+        Follow.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list('author_id', flat=True)
+    )
+
+
+def commented_ids(user, post_ids):
+    """Id постов из ``post_ids``, которые комментировал ``user``."""
+    post_ids = set(post_ids)
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return set(
+        Comment.objects.filter(
+            author=user, post_id__in=post_ids
+        ).order_by().values_list('post_id', flat=True).distinct()
+    )
+
+
+def annotate(posts, user, follows=None):
+    """Проставляет флаги посетителя ``user``, возвращает список постов.
+
+    ``follows`` — уже известные id авторов, на которых подписан
+    посетитель: тогда подписки отдельно не запрашиваются.
+    """
+    posts = list(posts)
+    if follows is None:
+        follows = following_ids(user, {post.author_id for post in posts})
+    commented = commented_ids(user, {post.pk for post in posts})
+    for post in posts:
+        post.viewer_is_author = (
+            user.is_authenticated and post.author_id == user.pk
+        )
+        post.viewer_follows = post.author_id in follows
+        post.viewer_commented = post.pk in commented
+    return posts
+
+
+def annotate_page(page_obj, user, follows=None):
+    """То же для страницы пагинатора; возвращает ``page_obj``."""
+    page_obj.object_list = annotate(page_obj.object_list, user, follows)
+    return page_obj
@@ -1,70 +1,137 @@
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import (HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from core.queries import query_budget
 
+from . import exporter, feed_cache, follows, viewer
+from .counters import stats_for
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator
+from .models import Group, Post, User, UserStats
+from .page_cache import (anonymous_page_cache, comment_scopes, group_scopes,
+                         index_scopes, post_scopes, profile_scopes)
+from .search import SearchPaginator
+from .timeline import TimelinePaginator
+from .utils import CommentPaginator, cursor_page, paginator
 
 
+@query_budget(6)
+@anonymous_page_cache(index_scopes)
 def index(request):
     posts = Post.objects.select_related('author', 'group').all()
     page_obj = paginator(request, posts)
+    if request.user.is_authenticated:
+        viewer.annotate_page(page_obj, request.user)
     context = {
         'page_obj': page_obj,
+        'cache_timeout': feed_cache.timeout(),
+        'cache_version': feed_cache.version((feed_cache.GLOBAL,)),
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(7)
+@anonymous_page_cache(group_scopes)
 def group_list(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(request, posts)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = paginator(request, posts, count=group.posts_count)
+    if request.user.is_authenticated:
+        viewer.annotate_page(page_obj, request.user)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cache_timeout': feed_cache.timeout(),
+        'cache_version': feed_cache.version((feed_cache.GROUP, group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(7)
+@anonymous_page_cache(profile_scopes)
 def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    page_obj = paginator(
+        request,
+        author.posts.select_related('author', 'group'),
+        count=stats_for(author).posts_count,
+    )
+    following = False
     if request.user.is_authenticated:
-        author = get_object_or_404(User, username=username)
-        page_obj = paginator(request, author.posts.all())
-        following = Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
-        context = {
-            'author': author,
-            'page_obj': page_obj,
-            'following': following,
-        }
-        return render(request, 'posts/profile.html', context)
-    else:
-        author = get_object_or_404(User, username=username)
-        page_obj = paginator(request, author.posts.all())
-        context = {
-            'author': author,
-            'page_obj': page_obj,
-        }
-        return render(request, 'posts/profile.html', context)
+        followed_ids = viewer.following_ids(request.user, [author.pk])
+        following = author.pk in followed_ids
+        viewer.annotate_page(page_obj, request.user, followed_ids)
+    context = {
+        'author': author,
+        'page_obj': page_obj,
+        'following': following,
+        'cache_timeout': feed_cache.timeout(),
+        'cache_version': feed_cache.version((feed_cache.AUTHOR, author.pk)),
+    }
+    return render(request, 'posts/profile.html', context)
+
+
+@query_budget(5)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = cursor_page(
+        request, SearchPaginator(query, settings.NUMBER_POSTS)
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
 
 
+@query_budget(7)
+@anonymous_page_cache(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    viewer.annotate([post], request.user)
     form = CommentForm()
-    comments = post.comments.all()
+    comments = cursor_page(request, CommentPaginator(
+        post.comments.select_related('author'), settings.NUMBER_COMMENTS
+    ))
     context = {
         'post': post,
         'form': form,
         'comments': comments,
+        'cache_timeout': feed_cache.timeout(),
+        'cache_version': feed_cache.version((feed_cache.POST, post.pk)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(4)
+@anonymous_page_cache(comment_scopes)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments = cursor_page(request, CommentPaginator(
+        post.comments.select_related('author'), settings.NUMBER_COMMENTS
+    ))
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(14)
 @login_required
 def post_create(request, *args, **kwargs):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     context = {
         'form': form,
     }
@@ -76,10 +143,11 @@ def post_create(request, *args, **kwargs):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(9)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
         request.POST or None,
@@ -97,6 +165,7 @@ def post_edit(request, post_id):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(9)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -109,31 +178,142 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(5)
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, posts)
+    page_obj = cursor_page(
+        request, TimelinePaginator(request.user, settings.NUMBER_POSTS)
+    )
+    # В ленте подписок только авторы, на которых посетитель подписан.
+    viewer.annotate_page(page_obj, request.user, follows={
+        post.author_id for post in page_obj.object_list
+    })
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
+def wants_json(request):
+    return (
+        request.is_ajax()
+        or 'application/json' in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+def follow_response(request, username, following):
+    """Редирект на профиль или, для AJAX, JSON с числом подписчиков."""
+    if not wants_json(request):
+        return redirect('posts:profile', username)
+    followers_count = UserStats.objects.filter(
+        user__username=username,
+    ).values_list('followers_count', flat=True).first()
+    return JsonResponse({
+        'username': username,
+        'following': following,
+        'followers_count': followers_count or 0,
+    })
+
+
+@query_budget(9)
 @login_required
 def profile_follow(request, username):
-    user = request.user
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
-    return redirect('posts:profile', author)
+    if not follows.follow(request.user, [username]):
+        # Ничего не создано: подписка уже есть, это сам пользователь
+        # или такого автора нет — тогда 404.
+        get_object_or_404(User.objects.only('pk'), username=username)
+    return follow_response(
+        request, username, username != request.user.username
+    )
 
 
+@query_budget(9)
 @login_required
 def profile_unfollow(request, username):
-    user = request.user
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
-    return redirect('posts:profile', author)
+    if not follows.unfollow(request.user, [username]):
+        get_object_or_404(User.objects.only('pk'), username=username)
+    return follow_response(request, username, False)
+
+
+@query_budget(9)
+@require_POST
+@login_required
+def follow_bulk(request):
+    """Массовая подписка для онбординга.
+
+    Имена авторов передаются полями ``username`` формы или JSON
+    ``{"usernames": [...]}``.
+    """
+    if request.content_type == 'application/json':
+        try:
+            usernames = json.loads(request.body)['usernames']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse(
+                {'error': 'Ожидается {"usernames": [...]}'}, status=400
+            )
+    else:
+        usernames = request.POST.getlist('username')
+    if not isinstance(usernames, list) or not all(
+        isinstance(username, str) for username in usernames
+    ):
+        return JsonResponse(
+            {'error': 'usernames должен быть списком строк'}, status=400
+        )
+    usernames = list(dict.fromkeys(usernames))
+    if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {settings.FOLLOW_BULK_LIMIT} авторов'},
+            status=400,
+        )
+    created = follows.follow(request.user, usernames)
+    following_count = UserStats.objects.filter(
+        user=request.user,
+    ).values_list('following_count', flat=True).first()
+    return JsonResponse({
+        'requested': len(usernames),
+        'followed': len(created),
+        'following_count': following_count or 0,
+    })
+
+
+def export_posts(request, scope, **filters):
+    """Отдаёт посты потоком: ``?format=ndjson|csv``, ``?compress=gzip``."""
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in exporter.FORMATS:
+        return HttpResponseBadRequest(
+            'Формат выгрузки: ' + ', '.join(exporter.FORMATS)
+        )
+    compress = request.GET.get('compress') == 'gzip'
+    response = StreamingHttpResponse(
+        exporter.export_stream(
+            exporter.export_queryset(**filters), fmt, compress
+        ),
+        content_type=(
+            'application/gzip' if compress
+            else f'{exporter.FORMATS[fmt]}; charset=utf-8'
+        ),
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        exporter.filename(scope, fmt, compress)
+    )
+    return response
+
+
+@query_budget(3)
+@login_required
+def export_group(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_posts(request, f'group-{group.slug}', group=group)
+
+
+@query_budget(3)
+@login_required
+def export_profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return export_posts(request, f'user-{author.username}', author=author)
+
+
+@query_budget(2)
+@staff_member_required
+def export_all(request):
+    return export_posts(request, 'all')
@@ -1,6 +1,8 @@
-from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+from django.template import loader
 
+from . import mail
 
 User = get_user_model()
 
@@ -9,3 +11,24 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class DeferredPasswordResetForm(PasswordResetForm):
+    """Сброс пароля: письмо отправляется задачей очереди."""
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = loader.render_to_string(subject_template_name, context)
+        subject = ''.join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(
+                html_email_template_name, context
+            )
+        # Повторная отправка формы в ту же секунду даёт тот же токен.
+        mail.defer(
+            subject, body, from_email, [to_email], html_body,
+            key=f'password_reset:{context["uid"]}:{context["token"]}',
+        )
@@ -0,0 +1,21 @@
+"""Отправка писем задачей очереди ``core.jobs``.
+
+Письмо целиком собирается в запросе, а отправка (запись файла
+``EMAIL_BACKEND`` или SMTP) выполняется в фоне и повторяется при сбоях.
+"""
+from django.core.mail import EmailMultiAlternatives
+
+from core import jobs
+
+
+def send(subject, body, from_email, to, html_body=None):
+    """Задача очереди: отправляет готовое письмо."""
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_body:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
+
+
+def defer(subject, body, from_email, to, html_body=None, key=None):
+    """Ставит отправку письма в очередь задач."""
+    return jobs.defer(send, subject, body, from_email, to, html_body, key=key)
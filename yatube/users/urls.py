@@ -4,7 +4,6 @@ from django.contrib.auth.views import (
     LoginView,
     PasswordChangeDoneView,
     PasswordChangeView,
-    PasswordResetView,
     PasswordResetDoneView,
     PasswordResetConfirmView,
     PasswordResetCompleteView,
@@ -43,8 +42,7 @@ urlpatterns = [
         name='password_change_done'),
     path(
         'password_reset/',
-        PasswordResetView.as_view(
-            template_name='users/password_reset_form.html'),
+        views.PasswordReset.as_view(),
         name='password_reset'),
     path(
         'password_reset/done/',
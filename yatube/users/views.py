@@ -1,9 +1,16 @@
+from django.contrib.auth.views import PasswordResetView
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
-from .forms import CreationForm
+from .forms import CreationForm, DeferredPasswordResetForm
 
 
 class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+
+class PasswordReset(PasswordResetView):
+    form_class = DeferredPasswordResetForm
+    success_url = reverse_lazy('users:password_reset_done')
+    template_name = 'users/password_reset_form.html'
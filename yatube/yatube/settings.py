@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -33,22 +34,37 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.StickyPrimaryMiddleware',
+    'core.middleware.ExpiredSessionsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Вне DEBUG шаблоны читаются и разбираются один раз на процесс
+# (cached.Loader); при разработке правки видны без перезапуска.
+template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    template_loaders = [
+        ('django.template.loaders.cached.Loader', template_loaders),
+    ]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -70,6 +86,23 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения — копии db.sqlite3, которые обновляет
+# manage.py sync_replicas. Пока реплика не синхронизирована (или отстала
+# больше REPLICA_MAX_LAG секунд), всё читается из default.
+DATABASE_REPLICAS = ['replica1']
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias in DATABASE_REPLICAS
+})
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+REPLICA_MAX_LAG = 60
+# Сколько секунд после записи посетитель читает из основной базы.
+REPLICA_STICKY_SECONDS = 10
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -100,10 +133,28 @@ USE_TZ = True
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 STATIC_URL = '/static/'
+# collectstatic собирает сюда файлы с хэшем в имени и их сжатые копии,
+# core.middleware.StaticFilesMiddleware отдаёт их с вечным кэшем.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Сеансы читаются из кэша и пишутся насквозь в базу; просроченные
+# удаляет фоновый поток раз в SESSION_CLEANUP_INTERVAL секунд
+# (core.sessions).
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CLEANUP_INTERVAL = 60 * 60
+
+# Пользователь запроса берётся из кэша процесса на USER_CACHE_SECONDS
+# (core.auth). ModelBackend оставлен для сеансов, созданных до него.
+AUTHENTICATION_BACKENDS = [
+    'core.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_SECONDS = 30
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -114,11 +165,91 @@ NUMBER_POSTS = 10  # Replace 10 with your desired number of posts per page
 
 NUMBER_POSTS_TEST_3_PAGE = 3
 
+# Комментариев на странице поста и в одной порции «Показать ещё».
+NUMBER_COMMENTS = 20
+
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются в follow_index при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Сколько авторов можно передать в один запрос массовой подписки.
+FOLLOW_BULK_LIMIT = 100
+
+
+# Миниатюры sorl, которые строятся задачей после загрузки картинки поста.
+# Постам без копий POST_IMAGE_WIDTHS (копии ещё строятся или картинку не
+# прочитать) шаблоны показывают первую из них, если она готова, иначе
+# оригинал.
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+# Загруженные картинки постов сжимаются до POST_IMAGE_MAX_SIZE по длинной
+# стороне, а для srcset строятся копии в WebP этих ширин с пропорциями
+# карточки поста (posts.images).
+POST_IMAGE_MAX_SIZE = 1920
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_QUALITY = 82
+
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Фрагменты лент сбрасываются сигналами моделей (posts.feed_cache),
+# поэтому таймаут может быть долгим.
+FEED_CACHE_TIMEOUT = 60 * 60
+# Готовые карточки постов (posts.cards): ключ меняется вместе с постом,
+# поэтому хранить их можно долго. После правки сигналы заново строят
+# карточки POST_CARD_WARM_LIMIT последних постов автора или группы.
+POST_CARD_TIMEOUT = 24 * 60 * 60
+POST_CARD_WARM_LIMIT = 50
+# Сколько хранить целые страницы для гостей (posts.page_cache).
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Общий для всех процессов кэш в файле SQLite (core.sqlite_cache).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+
+# Очередь фоновых задач в файле SQLite (core.jobs). JOB_WORKERS потоков
+# запускаются в веб-процессе при первой задаче; 0 — задачи выполняет
+# только manage.py run_jobs. Упавшая задача повторяется через
+# JOB_RETRY_DELAY * 2 ** (попытка - 1) секунд, не дольше
+# JOB_RETRY_MAX_DELAY, всего до JOB_MAX_ATTEMPTS попыток.
+JOB_QUEUE_PATH = os.path.join(BASE_DIR, 'jobs.sqlite3')
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 5
+JOB_RETRY_MAX_DELAY = 10 * 60
+# Сколько секунд задача принадлежит взявшему её потоку.
+JOB_TIMEOUT = 5 * 60
+# Сколько хранить выполненные задачи: столько же действуют их ключи.
+JOB_KEEP_SECONDS = 24 * 60 * 60
+
+# Учёт SQL-запросов (core.middleware.QueryBudgetMiddleware): повторы
+# одного запроса от SQL_REPEAT_THRESHOLD раз считаются N+1.
+SQL_REPEAT_THRESHOLD = 3
+SQL_STATS_HEADERS = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+TEST_RUNNER = 'core.runner.TestRunner'